@@ -0,0 +1,548 @@
+"""
+Benchmarks y mediciones de rendimiento del dashboard.
+
+Uso:
+    python benchmark.py rss --workers 4
+    python benchmark.py hover --eventos 200
+    python benchmark.py segmentacion --clientes 300 100000 1000000
+    python benchmark.py generacion --clientes 300 3000 --workers 1 2 4
+    python benchmark.py ytd --factores 1 10 100
+    python benchmark.py suite --clientes 300 3000 30000 --salida benchmark_resultados.jsonl
+    python benchmark.py arranque --sin-snapshot
+"""
+import argparse
+import datetime
+import inspect
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+
+# --- MEMORIA POR WORKER (gunicorn) ---
+
+def _leer_smaps(pid):
+    """Rss/Pss/Shared/Private (kB) de un proceso, desde /proc/<pid>/smaps_rollup (Linux)."""
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                valores[partes[0].rstrip(':')] = int(partes[1])
+    return {
+        'rss': valores.get('Rss', 0),
+        'pss': valores.get('Pss', 0),
+        'shared': valores.get('Shared_Clean', 0) + valores.get('Shared_Dirty', 0),
+        'private': valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0),
+    }
+
+
+def _hijos(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def _esperar_http(url, timeout):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} no respondió en {timeout}s")
+
+
+def medir_rss_workers(preload, workers=4, port=8765, timeout=180, espera=5, snapshot_dir=None):
+    """
+    Levanta `gunicorn dashboard:server` con o sin preload, espera a que todos los
+    workers carguen y devuelve la memoria (kB) del master y de cada worker. Sin
+    `snapshot_dir` arranca con un directorio de snapshots vacío (ETL completo).
+    """
+    env = dict(os.environ, GODATA_PRELOAD=str(preload), GODATA_SNAPSHOT_DIR=snapshot_dir or tempfile.mkdtemp())
+    # /readyz responde 200 solo cuando el worker ya tiene los datos cargados
+    cmd = [sys.executable, '-m', 'gunicorn', 'dashboard:server',
+           '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}/readyz"
+        _esperar_http(url, timeout)
+        time.sleep(espera)
+        for _ in range(workers * 4):
+            _esperar_http(url, timeout)
+        return {
+            'master': _leer_smaps(proc.pid),
+            'workers': [_leer_smaps(pid) for pid in _hijos(proc.pid)],
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def comando_rss(args):
+    import processing
+    # Caso de producción: preload con el snapshot ya construido (carga por mmap en el master)
+    snapshot_dir = tempfile.mkdtemp()
+    processing.construir_snapshot(directorio=snapshot_dir, **processing.parametros_escala())
+    resultados = {}
+    for etiqueta, preload, directorio in [('sin preload', False, None), ('con preload', True, None),
+                                          ('preload+snap', True, snapshot_dir)]:
+        print(f"Midiendo {args.workers} workers {etiqueta}...")
+        resultados[etiqueta] = medir_rss_workers(preload, workers=args.workers, port=args.port,
+                                                 snapshot_dir=directorio)
+
+    print(f"\n{'modo':<14}{'proceso':<10}{'RSS MB':>10}{'PSS MB':>10}{'compartido MB':>15}{'privado MB':>12}")
+    for etiqueta, medicion in resultados.items():
+        filas = [('master', medicion['master'])] + [(f"worker {i}", m) for i, m in enumerate(medicion['workers'], 1)]
+        for nombre, m in filas:
+            print(f"{etiqueta:<14}{nombre:<10}{m['rss'] / 1024:>10.1f}{m['pss'] / 1024:>10.1f}"
+                  f"{m['shared'] / 1024:>15.1f}{m['private'] / 1024:>12.1f}")
+        total_pss = sum(m['pss'] for _, m in filas) / 1024
+        print(f"{etiqueta:<14}{'TOTAL PSS':<10}{total_pss:>20.1f}\n")
+
+
+# --- TRÁFICO DE CALLBACKS POR HOVER ---
+
+def _payload(salida):
+    import plotly
+    return len(json.dumps(salida, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def _traza_hover(eventos, semilla=0):
+    """Secuencia de segmentos bajo el cursor: el usuario entra y sale de las burbujas y repite algunas."""
+    rnd = random.Random(semilla)
+    segmentos = ['Todos', 'Segmento 1', 'Segmento 2', 'Segmento 3', 'Segmento 4']
+    traza, actual = [], 'Todos'
+    for _ in range(eventos):
+        if rnd.random() < 0.3:
+            actual = rnd.choice(segmentos)
+        traza.append(actual)
+    return traza
+
+
+def medir_trafico_hover(eventos=200, year=2026, month=0):
+    """
+    Reproduce una traza de hover sobre la gráfica de burbujas y cuenta requests al servidor,
+    tiempo de servidor y bytes enviados, con el cableado anterior (hoverData como Input de
+    update_graph, que reescribía el Store en cada evento) y con el actual (callback clientside
+    que solo escribe el Store cuando cambia el segmento).
+    """
+    import dashboard
+    dashboard.datos.esperar()
+
+    def request(func, *args):
+        # Sin la cache de figuras ni la instrumentación: se mide el costo del cableado, no los hits
+        func = inspect.unwrap(func)
+        inicio = time.perf_counter()
+        salida = func(*args)
+        return time.perf_counter() - inicio, _payload(salida)
+
+    resultados = {}
+    for modo in ['antes', 'despues']:
+        requests, segundos, bytes_ = 0, 0.0, 0
+        segmento_store = 'Todos'
+        for segmento in _traza_hover(eventos):
+            llamadas = []
+            if modo == 'antes':
+                # update_graph (figura completa + Store) y luego la cascada en drill y tabla
+                llamadas.append((dashboard.update_graph, (year, month)))
+            elif segmento == segmento_store:
+                continue
+            segmento_store = segmento
+            llamadas.append((dashboard.update_drill_chart, (segmento, year, month)))
+            llamadas.append((dashboard.update_customer_table, (segmento, year, month, None)))
+            for func, args in llamadas:
+                t, b = request(func, *args)
+                requests += 1
+                segundos += t
+                bytes_ += b
+        resultados[modo] = {'requests': requests, 'segundos': segundos, 'bytes': bytes_}
+    return resultados
+
+
+def comando_hover(args):
+    resultados = medir_trafico_hover(eventos=args.eventos)
+    print(f"\n{args.eventos} eventos de hover")
+    print(f"{'cableado':<10}{'requests':>10}{'req/hover':>11}{'servidor ms':>13}{'KB enviados':>13}")
+    for modo, r in resultados.items():
+        print(f"{modo:<10}{r['requests']:>10}{r['requests'] / args.eventos:>11.2f}"
+              f"{r['segundos'] * 1000:>13.1f}{r['bytes'] / 1024:>13.1f}")
+
+
+# --- MOTOR DE SEGMENTACIÓN ---
+
+def _medir(func, *args, **kwargs):
+    """(segundos, pico de memoria MB según tracemalloc, resultado) de una llamada."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = func(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico / 1e6, resultado
+
+
+def _features_clientes(n, semilla=0):
+    """Features sintéticas por cliente (Profit total, % Cumplimiento) con la forma de las reales."""
+    import numpy as np
+    rng = np.random.default_rng(semilla)
+    grupo = rng.integers(0, 4, size=n)
+    profit = rng.normal(np.array([-2e5, 6e5, 1.2e6, 2e6])[grupo], 2.5e5)
+    cumplimiento = np.clip(rng.normal(np.array([20, 90, 140, 180])[grupo], 25), 0, None)
+    return np.column_stack([profit, cumplimiento])
+
+
+def comando_segmentacion(args):
+    import processing
+    print(f"{'clientes':>10}{'método':>12}{'segundos':>10}{'pico MB':>10}")
+    for n in args.clientes:
+        X = _features_clientes(n)
+        for metodo in ['kmeans', 'minibatch']:
+            segundos, pico, _ = _medir(processing.segmentar_clientes, X, metodo=metodo)
+            print(f"{n:>10}{metodo:>12}{segundos:>10.2f}{pico:>10.1f}")
+        # Refresco con warm start desde los centroides de la corrida anterior
+        _, modelo = processing.segmentar_clientes(X)
+        segundos, pico, _ = _medir(processing.segmentar_clientes, X, modelo=modelo)
+        print(f"{n:>10}{'warm start':>12}{segundos:>10.2f}{pico:>10.1f}")
+
+
+# --- GENERACIÓN PARALELA POR PARTICIÓN ---
+
+def comando_generacion(args):
+    import processing
+    print(f"CPUs disponibles: {os.cpu_count()}")
+    print(f"{'clientes':>10}{'workers':>9}{'segundos':>10}{'filas':>11}{'idéntico':>10}")
+    for n in args.clientes:
+        referencia = None
+        for workers in args.workers:
+            inicio = time.perf_counter()
+            df = processing.generar_base_datos(n_clientes=n, workers=workers)
+            segundos = time.perf_counter() - inicio
+            if referencia is None:
+                referencia = df
+            identico = referencia.equals(df) if workers != args.workers[0] else '-'
+            print(f"{n:>10}{workers:>9}{segundos:>10.2f}{len(df):>11}{str(identico):>10}")
+
+
+# --- NÚCLEO YTD (budget, cumplimiento y acumulados) ---
+
+def _hechos_ytd(factor, semilla=0):
+    """
+    Columnas que usan budget/cumplimiento y los acumulados YTD, con `factor` veces las filas
+    de la escala por defecto (más clientes, mismas fechas). Cada cliente aparece a lo sumo
+    una vez por día y las filas vienen en orden de fechas, como en la generación.
+    """
+    import numpy as np
+    import pandas as pd
+    import processing
+    escala = processing.ESCALA_POR_DEFECTO
+    fechas = pd.date_range(escala['fecha_inicio'], escala['fecha_fin'], freq='D')
+    n_clientes = escala['n_clientes'] * factor
+    n_activos = int(n_clientes * escala['tasa_actividad'])
+    rng = np.random.default_rng(semilla)
+    # Desplazamiento por día de un subconjunto fijo: clientes distintos dentro de cada día
+    cliente = (rng.permutation(n_clientes)[:n_activos][None, :]
+               + rng.integers(0, n_clientes, size=len(fechas))[:, None]) % n_clientes
+    dia = np.repeat(np.arange(len(fechas)), n_activos)
+    n = len(dia)
+    return pd.DataFrame({
+        'Date': fechas.to_numpy()[dia],
+        'Year': fechas.year.to_numpy(dtype=np.int64)[dia],
+        'CustomerKey': pd.Categorical.from_codes(cliente.ravel(), [f"CLT-{i:03d}" for i in range(1, n_clientes + 1)]),
+        'Profit': rng.normal(1000, 6000, size=n),
+    }), rng.random(n), rng.random(n)
+
+
+def _ytd_pandas(df, u_budget, u_cumplimiento):
+    """Camino anterior: np.where con temporales por rama, sort_values y dos groupby().cumsum()."""
+    import numpy as np
+    profit = df['Profit'].to_numpy()
+    budget = np.where(profit > 0, profit * (0.9 + (1.2 - 0.9) * u_budget), np.abs(profit) * 0.5)
+    low = np.where(profit >= 0, 50.0, 0.0)
+    high = np.where(profit >= 0, 100.0, 50.0)
+    low[budget == 0] = 0.0
+    high[budget == 0] = 100.0
+    df = df.assign(**{'Budget Profit': budget, '% Cumplimiento': low + (high - low) * u_cumplimiento})
+    df = df.sort_values(by=['CustomerKey', 'Date'])
+    grupos = df.groupby([df['Year'].to_numpy(), df['CustomerKey'].cat.codes.to_numpy()])
+    df['Profit Acumulado'] = grupos['Profit'].cumsum().to_numpy()
+    df['Budget Profit Acumulado'] = grupos['Budget Profit'].cumsum().to_numpy()
+    return df
+
+
+def _ytd_nucleo(df, u_budget, u_cumplimiento):
+    import nucleos
+    import processing
+    budget, cumplimiento = nucleos.derivar_budget_cumplimiento(df['Profit'].to_numpy(), u_budget, u_cumplimiento)
+    df = df.assign(**{'Budget Profit': budget, '% Cumplimiento': cumplimiento})
+    return processing._acumular_ytd(df)[0]
+
+
+def comando_ytd(args):
+    import nucleos
+    # La primera llamada con numba compila los núcleos (o los lee de la cache en disco)
+    _ytd_nucleo(*_hechos_ytd(1))
+    print(f"numba: {'sí' if nucleos.numba is not None else 'no (versión NumPy)'}")
+    print(f"{'factor':>7}{'filas':>12}{'pandas s':>10}{'núcleo s':>10}{'speedup':>9}{'idéntico':>10}")
+    for factor in args.factores:
+        df, u_budget, u_cumplimiento = _hechos_ytd(factor)
+        tiempos = {}
+        for nombre, func in [('pandas', _ytd_pandas), ('nucleo', _ytd_nucleo)]:
+            mejor = None
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                resultado = func(df, u_budget, u_cumplimiento)
+                segundos = time.perf_counter() - inicio
+                mejor = segundos if mejor is None else min(mejor, segundos)
+            tiempos[nombre] = (mejor, resultado)
+        identico = tiempos['pandas'][1].equals(tiempos['nucleo'][1])
+        print(f"{factor:>7}{len(df):>12}{tiempos['pandas'][0]:>10.2f}{tiempos['nucleo'][0]:>10.2f}"
+              f"{tiempos['pandas'][0] / tiempos['nucleo'][0]:>8.1f}x{str(identico):>10}")
+        del df, tiempos
+
+
+# --- SUITE POR ESCALA (generación, clustering, memoria y callbacks) ---
+
+def _callbacks_representativos(years):
+    """Entradas típicas de cada callback: año completo, un mes, búsqueda, orden y comparación de años."""
+    year = years[-1]
+    return [
+        ('update_graph', (year, 0)),
+        ('update_graph', (year, 6)),
+        ('update_segment_trends', (year, 6)),
+        ('update_drill_chart', ('Todos', year, 0)),
+        ('update_drill_chart', ('Segmento 1', year, 6)),
+        ('update_customer_table', ('Todos', year, 0, None)),
+        ('update_customer_table', ('Segmento 2', year, 6, 'cliente 1', 0, 10,
+                                   [{'column_id': 'Name', 'direction': 'asc'}])),
+        ('update_time_series', (years, 'D')),
+        ('update_time_series', (years, 'W')),
+        ('update_customer_history', (0,)),
+        ('update_store_chart', (year, 0, [], [])),
+        ('update_store_chart', (year, 6, ['Norte'], [])),
+    ]
+
+
+def medir_latencias_callbacks(repeticiones=20):
+    """
+    Latencia (ms) de cada callback del dashboard invocado directamente sobre los datos
+    publicados en `dashboard.datos`, sin la cache de figuras. Devuelve mediana y p95
+    por callback, agregando todas sus entradas representativas.
+    """
+    import dashboard
+    tiempos = {}
+    for nombre, args in _callbacks_representativos(sorted(dashboard.datos.series_diarias)):
+        func = inspect.unwrap(getattr(dashboard, nombre))
+        func(*args)  # calentamiento
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            func(*args)
+            tiempos.setdefault(nombre, []).append((time.perf_counter() - inicio) * 1000)
+    return {
+        nombre: {'mediana_ms': statistics.median(t), 'p95_ms': statistics.quantiles(t, n=20)[-1]}
+        for nombre, t in tiempos.items()
+    }
+
+
+def medir_escala(escala, repeticiones=20):
+    """Generación, clustering, memoria pico y latencia de callbacks para un punto de escala."""
+    import dashboard
+    import processing
+    metricas = {}
+    segundos, pico, df_diario = _medir(processing.generar_base_datos, **escala)
+    metricas['generacion'] = {'segundos': segundos, 'pico_mb': pico, 'filas': len(df_diario)}
+    df_diario = processing.compactar_para_compartir(df_diario)
+    segundos, pico, df_mensual = _medir(processing.generar_datos_clustering, df_diario)
+    metricas['clustering'] = {'segundos': segundos, 'pico_mb': pico, 'filas': len(df_mensual)}
+    df_mensual = processing.compactar_para_compartir(df_mensual)
+
+    inicio = time.perf_counter()
+    dashboard.datos.publicar(**dashboard.preparar_datos(df_diario, df_mensual))
+    dashboard.cache_figuras.namespace = processing.clave_snapshot(seed=42, **escala)
+    metricas['estructuras_dashboard'] = {'segundos': time.perf_counter() - inicio}
+    metricas['callbacks'] = medir_latencias_callbacks(repeticiones)
+    # ru_maxrss está en kB en Linux; es el máximo del proceso hasta este punto
+    metricas['rss_max_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return metricas
+
+
+def _aplanar(metricas, prefijo=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, para comparar corridas métrica por métrica."""
+    plano = {}
+    for clave, valor in metricas.items():
+        if isinstance(valor, dict):
+            plano.update(_aplanar(valor, f"{prefijo}{clave}."))
+        else:
+            plano[f"{prefijo}{clave}"] = valor
+    return plano
+
+
+def _cargar_resultados(ruta):
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding='utf-8') as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comando_suite(args):
+    import processing
+    anteriores = _cargar_resultados(args.salida)
+    regresiones = 0
+    for n in args.clientes:
+        escala = dict(processing.ESCALA_POR_DEFECTO, n_clientes=n, n_tiendas=args.tiendas,
+                      tasa_actividad=args.tasa_actividad, fecha_inicio=args.desde, fecha_fin=args.hasta)
+        print(f"\n=== {n} clientes, {args.tiendas} tiendas, actividad {args.tasa_actividad:.0%}, "
+              f"{args.desde} a {args.hasta} ===")
+        metricas = medir_escala(escala, repeticiones=args.repeticiones)
+        registro = {
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit_actual(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'escala': {clave: str(valor) if isinstance(valor, datetime.date) else valor
+                       for clave, valor in escala.items()},
+            'metricas': metricas,
+        }
+        # Línea base: la última corrida guardada con la misma escala
+        base = next((r for r in reversed(anteriores) if r['escala'] == registro['escala']), None)
+        plano_base = _aplanar(base['metricas']) if base else {}
+        print(f"{'métrica':<42}{'actual':>12}{'anterior':>12}{'cambio':>9}")
+        for clave, valor in _aplanar(metricas).items():
+            previo = plano_base.get(clave)
+            linea = f"{clave:<42}{valor:>12.2f}"
+            if previo:
+                cambio = valor / previo - 1
+                # Más tiempo o más memoria es peor; las filas no son métricas de costo
+                es_costo = not clave.endswith('.filas')
+                marca = '  REGRESIÓN' if es_costo and cambio > args.tolerancia else ''
+                regresiones += bool(marca)
+                linea += f"{previo:>12.2f}{cambio:>+9.0%}{marca}"
+            print(linea)
+        with open(args.salida, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro) + '\n')
+    print(f"\nResultados agregados a {args.salida}"
+          + (f"; {regresiones} métricas empeoraron más de {args.tolerancia:.0%}." if regresiones else "."))
+    if regresiones and args.fallar_si_regresion:
+        sys.exit(1)
+
+
+# --- ARRANQUE: DEL IMPORT AL PRIMER BYTE ---
+
+def _segundos_hasta_200(url, inicio, timeout, intervalo=0.05):
+    """Segundos desde `inicio` hasta la primera respuesta 200 de `url`."""
+    limite = time.perf_counter() + timeout
+    while time.perf_counter() < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                resp.read(1)
+                if resp.status == 200:
+                    return time.perf_counter() - inicio
+        except OSError:
+            pass
+        time.sleep(intervalo)
+    raise TimeoutError(f"{url} no respondió en {timeout}s")
+
+
+def medir_arranque(lazy, preload, snapshot_dir, port=8766, timeout=300):
+    """
+    Arranca `gunicorn dashboard:server` (1 worker) y mide, desde el inicio del proceso, el
+    primer byte de /healthz y de la página, y cuándo /readyz indica datos listos.
+    """
+    env = dict(os.environ, GODATA_LAZY_LOAD=str(lazy), GODATA_PRELOAD=str(preload),
+               GODATA_SNAPSHOT_DIR=snapshot_dir)
+    cmd = [sys.executable, '-m', 'gunicorn', 'dashboard:server',
+           '--bind', f'127.0.0.1:{port}', '--workers', '1']
+    inicio = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        return {
+            'healthz': _segundos_hasta_200(f"{base}/healthz", inicio, timeout),
+            'pagina': _segundos_hasta_200(f"{base}/", inicio, timeout),
+            'listo': _segundos_hasta_200(f"{base}/readyz", inicio, timeout),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def comando_arranque(args):
+    print(f"{'carga':<12}{'preload':<9}{'snapshot':<10}{'healthz s':>11}{'página s':>10}{'datos listos s':>16}")
+    for lazy in [False, True]:
+        for preload in [False, True]:
+            # Sin snapshot: directorio vacío en cada corrida (ETL + clustering completos)
+            snapshot_dir = tempfile.mkdtemp() if args.sin_snapshot else args.dir
+            t = medir_arranque(lazy, preload, snapshot_dir, port=args.port)
+            print(f"{'perezosa' if lazy else 'bloqueante':<12}{str(preload):<9}"
+                  f"{'no' if args.sin_snapshot else 'sí':<10}{t['healthz']:>11.2f}{t['pagina']:>10.2f}{t['listo']:>16.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del dashboard GoData.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_rss = sub.add_parser('rss', help="RSS/PSS por worker de gunicorn: sin preload, con preload y con preload + snapshot.")
+    p_rss.add_argument('--workers', type=int, default=4)
+    p_rss.add_argument('--port', type=int, default=8765)
+    p_rss.set_defaults(func=comando_rss)
+
+    p_hover = sub.add_parser('hover', help="Requests, tiempo y bytes de servidor por evento de hover.")
+    p_hover.add_argument('--eventos', type=int, default=200)
+    p_hover.set_defaults(func=comando_hover)
+
+    p_seg = sub.add_parser('segmentacion', help="Tiempo y memoria del clustering: KMeans original vs MiniBatch.")
+    p_seg.add_argument('--clientes', type=int, nargs='+', default=[300, 100_000, 1_000_000])
+    p_seg.set_defaults(func=comando_segmentacion)
+
+    p_gen = sub.add_parser('generacion', help="Tiempo de generación de datos según número de workers.")
+    p_gen.add_argument('--clientes', type=int, nargs='+', default=[300, 3000])
+    p_gen.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    p_gen.set_defaults(func=comando_generacion)
+
+    p_ytd = sub.add_parser('ytd', help="Budget, cumplimiento y acumulados YTD: pandas vs núcleo fusionado.")
+    p_ytd.add_argument('--factores', type=int, nargs='+', default=[1, 10, 100],
+                       help="Múltiplos de las filas de la escala por defecto.")
+    p_ytd.add_argument('--repeticiones', type=int, default=3)
+    p_ytd.set_defaults(func=comando_ytd)
+
+    p_suite = sub.add_parser('suite', help="Generación, clustering, memoria y latencia de callbacks por escala.")
+    p_suite.add_argument('--clientes', type=int, nargs='+', default=[300, 3000, 30000])
+    p_suite.add_argument('--tiendas', type=int, default=8)
+    p_suite.add_argument('--tasa-actividad', type=float, default=0.4)
+    p_suite.add_argument('--desde', type=datetime.date.fromisoformat, default=datetime.date(2024, 1, 1))
+    p_suite.add_argument('--hasta', type=datetime.date.fromisoformat, default=datetime.date(2026, 12, 31))
+    p_suite.add_argument('--repeticiones', type=int, default=20, help="Llamadas por entrada de callback.")
+    p_suite.add_argument('--salida', default='benchmark_resultados.jsonl',
+                         help="Archivo JSON Lines donde se acumulan las corridas.")
+    p_suite.add_argument('--tolerancia', type=float, default=0.2,
+                         help="Empeoramiento relativo a partir del cual se marca una regresión.")
+    p_suite.add_argument('--fallar-si-regresion', action='store_true',
+                         help="Termina con código 1 si alguna métrica es una regresión.")
+    p_suite.set_defaults(func=comando_suite)
+
+    p_arr = sub.add_parser('arranque', help="Tiempo del inicio de gunicorn al primer byte y a datos listos.")
+    p_arr.add_argument('--sin-snapshot', action='store_true', help="Fuerza ETL + clustering en cada arranque.")
+    p_arr.add_argument('--dir', default='snapshot', help="Directorio de snapshots (sin --sin-snapshot).")
+    p_arr.add_argument('--port', type=int, default=8766)
+    p_arr.set_defaults(func=comando_arranque)
+
+    args = parser.parse_args()
+    args.func(args)
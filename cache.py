@@ -0,0 +1,185 @@
+"""
+Cache de figuras serializadas (JSON) para los callbacks del dashboard.
+
+Los datos no cambian después de iniciar la app, así que la salida de un callback depende
+solo de sus entradas. Se guarda la salida serializada en un LRU en memoria por proceso y,
+opcionalmente, en un archivo SQLite compartido por todos los workers de gunicorn. Los estados
+de los filtros se pueden además precalcular a disco (FigurasPrecalculadas).
+"""
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import plotly
+
+logger = logging.getLogger('godata.cache')
+
+MANIFIESTO_PRECALCULADO = 'manifiesto.json'
+
+
+class CacheFiguras:
+    def __init__(self, max_items=256, ruta_sqlite=None, namespace=''):
+        self.max_items = max_items
+        self.ruta_sqlite = ruta_sqlite
+        self.namespace = namespace
+        self.hits = 0
+        self.hits_compartidos = 0
+        self.misses = 0
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if ruta_sqlite:
+            with self._conexion() as con:
+                con.execute("CREATE TABLE IF NOT EXISTS figuras (clave TEXT PRIMARY KEY, valor TEXT, usado REAL)")
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        con = getattr(self._local, 'con', None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.ruta_sqlite, timeout=10)
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def _guardar_memoria(self, clave, valor):
+        with self._lock:
+            self._memoria[clave] = valor
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_items:
+                self._memoria.popitem(last=False)
+
+    def obtener(self, clave):
+        """JSON guardado para `clave`, o None. Cuenta hits (memoria o compartido) y misses."""
+        with self._lock:
+            valor = self._memoria.get(clave)
+            if valor is not None:
+                self._memoria.move_to_end(clave)
+                self.hits += 1
+                return valor
+        if self.ruta_sqlite:
+            with self._conexion() as con:
+                fila = con.execute("SELECT valor FROM figuras WHERE clave = ?", (clave,)).fetchone()
+                if fila is not None:
+                    con.execute("UPDATE figuras SET usado = ? WHERE clave = ?", (time.time(), clave))
+            if fila is not None:
+                self._guardar_memoria(clave, fila[0])
+                with self._lock:
+                    self.hits_compartidos += 1
+                return fila[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def guardar(self, clave, valor):
+        self._guardar_memoria(clave, valor)
+        if self.ruta_sqlite:
+            with self._conexion() as con:
+                con.execute("INSERT OR REPLACE INTO figuras (clave, valor, usado) VALUES (?, ?, ?)",
+                            (clave, valor, time.time()))
+                # Desalojo LRU del backend compartido
+                con.execute("DELETE FROM figuras WHERE clave NOT IN "
+                            "(SELECT clave FROM figuras ORDER BY usado DESC LIMIT ?)", (self.max_items,))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'hits_compartidos': self.hits_compartidos,
+                'misses': self.misses,
+                'items_memoria': len(self._memoria),
+                'max_items': self.max_items,
+                'backend_compartido': self.ruta_sqlite,
+            }
+
+    def memoizar(self, func):
+        """Decorador para callbacks: la clave es (namespace, nombre del callback, entradas)."""
+        @functools.wraps(func)
+        def wrapper(*args):
+            clave = json.dumps([self.namespace, func.__name__, args], default=str)
+            valor = self.obtener(clave)
+            if valor is not None:
+                return json.loads(valor)
+            salida = func(*args)
+            self.guardar(clave, json.dumps(salida, cls=plotly.utils.PlotlyJSONEncoder))
+            return salida
+        return wrapper
+
+
+class FigurasPrecalculadas:
+    """
+    Salidas de callbacks generadas de antemano (`python dashboard.py --precalcular DIR`), una
+    por estado de los filtros, en `DIR/<callback>/<estado>.json`. El directorio también se
+    puede publicar tal cual en un bucket estático o CDN. Solo se usa si su manifiesto
+    corresponde al mismo namespace (snapshot) que la app.
+    """
+
+    def __init__(self, directorio=None, namespace=''):
+        self.directorio = None
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not directorio:
+            return
+        try:
+            with open(os.path.join(directorio, MANIFIESTO_PRECALCULADO)) as f:
+                manifiesto = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Sin manifiesto de figuras precalculadas en %s; se calculan en vivo", directorio)
+            return
+        if manifiesto.get('namespace') != namespace:
+            logger.warning("Figuras precalculadas de otros datos (%s != %s); se ignoran",
+                           manifiesto.get('namespace'), namespace)
+            return
+        self.directorio = directorio
+
+    @staticmethod
+    def nombre_estado(estado):
+        return '_'.join(str(valor) for valor in estado) + '.json'
+
+    @staticmethod
+    def escribir(directorio, callback, estado, salida):
+        """Guarda la salida serializada de `callback` para `estado` (escritura atómica)."""
+        carpeta = os.path.join(directorio, callback)
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, FigurasPrecalculadas.nombre_estado(estado))
+        texto = json.dumps(salida, cls=plotly.utils.PlotlyJSONEncoder)
+        with open(ruta + '.tmp', 'w') as f:
+            f.write(texto)
+        os.replace(ruta + '.tmp', ruta)
+        return len(texto)
+
+    def servir(self, estado):
+        """
+        Decorador para callbacks: `estado(*args)` devuelve la tupla que identifica la salida
+        precalculada (o None si esas entradas no se precalculan, p. ej. con búsqueda). Va
+        encima de `datos.requerido`, así los estados precalculados no esperan a los datos.
+        """
+        def decorador(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                clave = estado(*args) if self.directorio else None
+                if clave is not None:
+                    ruta = os.path.join(self.directorio, func.__name__, self.nombre_estado(clave))
+                    try:
+                        with open(ruta) as f:
+                            salida = json.load(f)
+                    except FileNotFoundError:
+                        pass
+                    else:
+                        with self._lock:
+                            self.hits += 1
+                        return salida
+                    with self._lock:
+                        self.misses += 1
+                return func(*args)
+            return wrapper
+        return decorador
+
+    def estadisticas(self):
+        with self._lock:
+            return {'directorio': self.directorio, 'hits': self.hits, 'misses': self.misses}
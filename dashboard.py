@@ -4,12 +4,106 @@ from dash import dcc, html, Input, Output, State, dash_table
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import processing  # Importamos el módulo que acabamos de crear
+import exportacion
+from flask import Response, request, send_from_directory
+from cache import CacheFiguras, FigurasPrecalculadas, MANIFIESTO_PRECALCULADO
+from metricas import MetricasCallbacks
+from proveedor import ProveedorDatos
 
 # --- CARGA DE DATOS ---
-# Esto se ejecuta una vez al iniciar la aplicación
-df_diario = processing.generar_base_datos()
-df_mensual_segmentado = processing.generar_datos_clustering(df_diario)
+# Usa el snapshot en disco si existe (ver `python processing.py --snapshot`) y solo regenera
+# el ETL si falta. La escala de la base simulada se toma del entorno (GODATA_CLIENTES, ...).
+ESCALA = processing.parametros_escala()
+
+def _version_figuras():
+    """Hash del código que arma las figuras (este módulo y `processing`)."""
+    h = hashlib.sha256()
+    for ruta in (__file__, processing.__file__):
+        with open(ruta, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+# Cache LRU de figuras serializadas. Con GODATA_FIGURE_CACHE=<ruta .sqlite> se comparte entre workers;
+# el namespace (clave del snapshot + versión del código) evita servir figuras de otros datos o de
+# un deploy anterior si el archivo vive en almacenamiento persistente.
+cache_figuras = CacheFiguras(
+    max_items=int(os.environ.get('GODATA_FIGURE_CACHE_SIZE', 256)),
+    ruta_sqlite=os.environ.get('GODATA_FIGURE_CACHE'),
+    namespace=f"{processing.clave_snapshot(seed=42, **ESCALA)}-{_version_figuras()}",
+)
+
+# Salidas precalculadas por estado de los filtros (`python dashboard.py --precalcular DIR`);
+# con GODATA_PRECOMPUTED_DIR se sirven desde disco sin tocar los datos.
+figuras_precalculadas = FigurasPrecalculadas(
+    directorio=os.environ.get('GODATA_PRECOMPUTED_DIR'),
+    namespace=cache_figuras.namespace,
+)
+# Callbacks con salidas precalculadas (subdirectorios del árbol; ver `estados_precalculables`)
+CALLBACKS_PRECALCULADOS = ('update_graph', 'update_segment_trends', 'update_drill_chart', 'update_customer_table')
+
+# Latencia por callback y fase, tamaño de respuesta (GET /metrics). Con GODATA_SLOW_CALLBACK_MS
+# se loguean los callbacks que superan ese tiempo junto con sus entradas.
+metricas = MetricasCallbacks(
+    umbral_lento_ms=float(os.environ['GODATA_SLOW_CALLBACK_MS']) if os.environ.get('GODATA_SLOW_CALLBACK_MS') else None,
+)
+
+def preparar_datos(df_diario, df_mensual_segmentado):
+    """
+    Datos que leen los callbacks: las tablas y sus estructuras derivadas. Los benchmarks lo
+    usan con `datos.publicar(**preparar_datos(...))` para cambiar de escala sin reimportar.
+    """
+    dim_clientes, dim_tiendas = processing.construir_dimensiones(df_diario)
+    # Tabla mensual ordenada por (Year, Month) con el rango de filas de cada período
+    periodos = processing.construir_indice_periodos(df_mensual_segmentado)
+    indice_clientes = processing.construir_indice_clientes(df_diario)
+    segmento_cliente = processing.segmento_por_cliente(df_mensual_segmentado, len(dim_clientes))
+    return {
+        'df_diario': df_diario,
+        'df_mensual_segmentado': periodos['tabla'],
+        'periodos': periodos,
+        # Cubo (Year, Month) -> agregados por cliente y por segmento, compartido por la gráfica
+        # de burbujas, el drill-down y la tabla (los meses son vistas de la tabla ordenada)
+        'cubo_segmentos': processing.construir_cubo_segmentos(periodos['tabla'], periodos),
+        # Profit diario total por año (arreglos indexados por día del año) para la serie de tiempo
+        'series_diarias': processing.construir_series_diarias(df_diario),
+        'dim_clientes': dim_clientes,
+        'dim_tiendas': dim_tiendas,
+        # Nombres en minúsculas para la búsqueda de la tabla (posición = clave sustituta del cliente)
+        'indice_nombres': processing.construir_indice_nombres(dim_clientes['Name']),
+        # Offsets de las filas diarias de cada cliente, para el historial del drill-through
+        'indice_clientes': indice_clientes,
+        # Segmento de cada cliente (por clave sustituta), para filtrar exportaciones diarias
+        'segmento_cliente': segmento_cliente,
+        # Profit de los últimos 7/30/90 días y MoM/YoY por segmento (grillas precalculadas; las
+        # grillas por cliente no se arman porque ningún callback las consulta)
+        'metricas_moviles': processing.construir_metricas_moviles(
+            df_diario, indice_clientes, segmento_cliente, df_mensual_segmentado['Segmento'].cat.categories),
+        # Agregado (Year, Month, Tienda, Segmento) con la zona, indexado por período, para la vista de tiendas
+        'periodos_tiendas': processing.construir_indice_periodos(
+            processing.construir_agregado_tiendas(df_diario, df_mensual_segmentado)),
+    }
+
+# Los datos se cargan en segundo plano: el servidor acepta conexiones y responde /healthz
+# mientras tanto, y los callbacks esperan hasta GODATA_DATA_WAIT_S segundos a que estén listos.
+# GODATA_LAZY_LOAD=False vuelve a la carga bloqueante al importar.
+datos = ProveedorDatos(
+    lambda: preparar_datos(*processing.cargar_o_generar(**ESCALA)),
+    espera_maxima=float(os.environ.get('GODATA_DATA_WAIT_S', 60)),
+)
+datos.iniciar(en_segundo_plano=os.environ.get('GODATA_LAZY_LOAD', 'True') == 'True')
+
+# Años de la ventana configurada (filtros de año): no requieren esperar a los datos
+YEARS = list(range(ESCALA['fecha_inicio'].year, ESCALA['fecha_fin'].year + 1))
 
 # Diccionario de meses para el Dropdown
 meses_dict = {
@@ -17,6 +111,19 @@ meses_dict = {
     7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
 }
 
+# Colores de las líneas por año en la serie de tiempo
+COLORES_YEAR = {2024: '#3498db', 2025: '#e74c3c', 2026: '#27ae60'}
+
+# Granularidad de la serie de tiempo (frecuencia de resample de pandas)
+GRANULARIDADES = {'D': 'Diario', 'W': 'Semanal', 'MS': 'Mensual'}
+
+# Render adaptativo: por encima de este número de puntos las gráficas usan WebGL (Scattergl)
+UMBRAL_WEBGL = int(os.environ.get('GODATA_WEBGL_POINTS', 1000))
+# Puntos por píxel de ancho de la gráfica al reducir series largas con LTTB
+PUNTOS_POR_PIXEL = 1
+# Ancho supuesto antes de que el navegador informe el tamaño real de la gráfica
+ANCHO_GRAFICA_DEFECTO = 1200
+
 # --- ESTILOS CSS ---
 FILTERS_STYLE = {
     "backgroundColor": "#ecf0f1",
@@ -70,9 +177,94 @@ app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = "GoData Financial Dashboard"
 server = app.server  # Exponer el server para deployment
 
+@server.route('/cache-stats')
+def cache_stats():
+    return {**cache_figuras.estadisticas(), 'precalculadas': figuras_precalculadas.estadisticas()}
+
+@server.route('/precalculado/<callback>/<archivo>')
+def precalculado(callback, archivo):
+    # El mismo árbol que se puede publicar en un bucket estático o CDN
+    if figuras_precalculadas.directorio is None or callback not in CALLBACKS_PRECALCULADOS:
+        return {'error': "Sin figuras precalculadas"}, 404
+    # safe_join valida la ruta completa (callback y archivo) dentro del directorio
+    return send_from_directory(figuras_precalculadas.directorio, f"{callback}/{archivo}",
+                               mimetype='application/json', max_age=3600)
+
+@server.route('/healthz')
+def healthz():
+    # Liveness: el proceso responde, aunque los datos todavía se estén cargando
+    return {'status': 'ok'}
+
+@server.route('/readyz')
+def readyz():
+    # Readiness: 200 solo cuando los callbacks ya pueden servir datos
+    estado = datos.estado()
+    return estado, 200 if estado['listo'] else 503
+
+@server.route('/metrics')
+def metrics():
+    return metricas.exportar(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+metricas.registrar_en(server)
+
+# Exportaciones simultáneas por worker (cada una ocupa un hilo mientras transmite)
+limite_exportaciones = exportacion.LimiteExportaciones(int(os.environ.get('GODATA_EXPORT_CONCURRENCY', 2)))
+
+@server.route('/export')
+def export():
+    """
+    Filas de la selección actual en streaming: ?tabla=diario|mensual&year=2026&month=0
+    &segmento=Todos&formato=csv|parquet. Se envían por bloques, sin armar el archivo en memoria.
+    """
+    tabla = request.args.get('tabla', 'mensual')
+    formato = request.args.get('formato', 'csv')
+    segmento = request.args.get('segmento', 'Todos')
+    try:
+        year = int(request.args['year'])
+        month = int(request.args.get('month', 0))
+    except (KeyError, ValueError):
+        return {'error': "Parámetros 'year' y 'month' enteros requeridos"}, 400
+    # Se valida antes de empezar a transmitir: un error dentro del generador llega como un
+    # cuerpo truncado con status 200
+    if year not in YEARS or not 0 <= month <= 12:
+        return {'error': f"Período fuera de rango: year en {YEARS[0]}-{YEARS[-1]}, month en 0-12"}, 400
+    if tabla not in ('diario', 'mensual') or formato not in exportacion.FORMATOS:
+        return {'error': "tabla debe ser diario|mensual y formato csv|parquet"}, 400
+    if not exportacion.formato_disponible(formato):
+        return {'error': f"Formato {formato} no disponible (requiere pyarrow)"}, 501
+    if not datos.esperar(datos.espera_maxima):
+        return {'error': "Datos todavía cargando"}, 503
+
+    segmentos = list(datos.df_mensual_segmentado['Segmento'].cat.categories)
+    if segmento != 'Todos' and segmento not in segmentos:
+        return {'error': f"Segmento desconocido: {segmento}"}, 400
+    if tabla == 'diario':
+        df = datos.df_diario
+        clientes = None
+        if segmento != 'Todos':
+            clientes = np.flatnonzero(datos.segmento_cliente == segmentos.index(segmento))
+        bloques = processing.posiciones_periodo_diario(df, datos.indice_clientes, year, month, clientes)
+    else:
+        df = datos.df_mensual_segmentado
+        inicio, fin = datos.periodos['rangos'].get((year, month), (0, 0))
+        posiciones = np.arange(inicio, fin)
+        if segmento != 'Todos':
+            posiciones = posiciones[df['Segmento'].cat.codes.to_numpy()[inicio:fin] == segmentos.index(segmento)]
+        bloques = (posiciones[i:i + 100_000] for i in range(0, len(posiciones), 100_000))
+
+    if not limite_exportaciones.adquirir():
+        return {'error': "Demasiadas exportaciones en curso, intente de nuevo"}, 429
+    codificar = exportacion.bloques_csv if formato == 'csv' else exportacion.bloques_parquet
+    tipo, extension = exportacion.FORMATOS[formato]
+    nombre = f"godata_{tabla}_{year}_{month:02d}_{segmento.replace(' ', '_')}.{extension}"
+    return Response(limite_exportaciones.envolver(codificar(df, bloques, list(df.columns))), mimetype=tipo,
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}"'})
+
 # --- LAYOUT ---
 app.layout = html.Div([
     dcc.Store(id='selected-segment-store'),
+    # Clave sustituta (código) del cliente elegido en el drill-down o en la tabla
+    dcc.Store(id='selected-customer-store'),
 
     html.Div([
         # Sidebar
@@ -95,8 +287,8 @@ app.layout = html.Div([
                     html.Label("Seleccionar Año:", style={'fontWeight': 'bold', 'marginBottom': '5px', 'display': 'block'}),
                     dcc.Dropdown(
                         id='year-filter',
-                        options=[{'label': str(y), 'value': y} for y in [2024, 2025, 2026]],
-                        value=2026,
+                        options=[{'label': str(y), 'value': y} for y in YEARS],
+                        value=YEARS[-1],
                         clearable=False,
                         style={'color': 'black'}
                     ),
@@ -139,6 +331,34 @@ app.layout = html.Div([
                 }),
             ], style={'display': 'flex', 'gap': '20px', 'marginBottom': '20px'}),
 
+            # Tendencia por segmento: últimos 7/30/90 días al cierre del período y variación MoM/YoY
+            html.Div([
+                html.H3(id='segment-trends-title', style={'color': '#2c3e50', 'marginBottom': '15px'}),
+                dash_table.DataTable(
+                    id='segment-trends-table',
+                    columns=[{'name': 'Segmento', 'id': 'Segmento'}] + [
+                        {'name': nombre, 'id': col, 'type': 'numeric',
+                         'format': {'specifier': '+.1f' if col.startswith('Δ') else ',.0f'}}
+                        for col, nombre in [('Profit 7d', 'Últimos 7 días'), ('Profit 30d', 'Últimos 30 días'),
+                                            ('Profit 90d', 'Últimos 90 días'), ('Profit', 'Profit del período'),
+                                            ('Δ MoM %', 'Δ MoM %'), ('Δ YoY %', 'Δ YoY %')]
+                    ],
+                    data=[],
+                    style_cell={'textAlign': 'left', 'padding': '10px', 'fontFamily': 'Arial, sans-serif'},
+                    style_header={'backgroundColor': '#2c3e50', 'color': 'white', 'fontWeight': 'bold'},
+                    style_data_conditional=[
+                        {'if': {'filter_query': f'{{{col}}} < 0', 'column_id': col}, 'color': '#c0392b'}
+                        for col in ['Δ MoM %', 'Δ YoY %']
+                    ],
+                )
+            ], style={
+                'backgroundColor': 'white',
+                'padding': '20px',
+                'borderRadius': '10px',
+                'boxShadow': '0 4px 8px 0 rgba(0,0,0,0.2)',
+                'marginBottom': '20px'
+            }),
+
             # Tercera fila: Tabla resumen de clientes
             html.Div([
                 html.H3("Resumen de Clientes", style={'color': '#2c3e50', 'marginBottom': '15px'}),
@@ -159,6 +379,14 @@ app.layout = html.Div([
                     )
                 ], style={'marginBottom': '15px'}),
                 
+                # Descarga de las filas de la selección (año, mes y segmento actuales)
+                html.Div([
+                    html.Span("Descargar selección: ", style={'fontWeight': 'bold', 'marginRight': '10px'}),
+                    html.A("Mensual (CSV)", id='export-mensual-csv', href='', style={'marginRight': '15px'}),
+                    html.A("Diario (CSV)", id='export-diario-csv', href='', style={'marginRight': '15px'}),
+                    html.A("Diario (Parquet)", id='export-diario-parquet', href=''),
+                ], style={'marginBottom': '15px'}),
+
                 dash_table.DataTable(
                     id='customer-table',
                     columns=[
@@ -184,9 +412,13 @@ app.layout = html.Div([
                             'backgroundColor': '#f9f9f9'
                         }
                     ],
+                    # Paginación y orden en el servidor: solo viaja la página actual
+                    page_action='custom',
+                    page_current=0,
                     page_size=10,
-                    sort_action='native',
-                    filter_action='native'
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[]
                 )
             ], style={
                 'backgroundColor': 'white',
@@ -196,10 +428,83 @@ app.layout = html.Div([
                 'marginBottom': '20px'
             }),
 
+            # Historial diario del cliente elegido (click en el drill-down o en la tabla)
+            html.Div([
+                html.H3(id='customer-history-title', children="Historial del Cliente",
+                        style={'color': '#2c3e50', 'marginBottom': '15px'}),
+                dcc.Graph(id='customer-history-chart', style={'height': '500px'})
+            ], style={
+                'backgroundColor': 'white',
+                'padding': '20px',
+                'borderRadius': '10px',
+                'boxShadow': '0 4px 8px 0 rgba(0,0,0,0.2)',
+                'marginBottom': '20px'
+            }),
+
+            # Rentabilidad por tienda y zona (usa también los filtros de año y mes)
+            html.Div([
+                html.H3("Rentabilidad por Tienda y Zona", style={'color': '#2c3e50', 'marginBottom': '15px'}),
+                html.Div([
+                    html.Div([
+                        html.Label("Zonas:", style={'fontWeight': 'bold', 'marginBottom': '5px', 'display': 'block'}),
+                        dcc.Dropdown(
+                            id='zone-filter',
+                            options=[{'label': zona, 'value': zona} for zona in processing.ZONAS],
+                            value=[],
+                            multi=True,
+                            placeholder='Todas las zonas',
+                            style={'color': 'black'}
+                        ),
+                    ], style=FILTER_ITEM_STYLE),
+                    html.Div([
+                        html.Label("Tiendas:", style={'fontWeight': 'bold', 'marginBottom': '5px', 'display': 'block'}),
+                        dcc.Dropdown(
+                            id='store-filter',
+                            options=[],
+                            value=[],
+                            multi=True,
+                            placeholder='Todas las tiendas',
+                            style={'color': 'black'}
+                        ),
+                    ], style=FILTER_ITEM_STYLE),
+                ], style={'display': 'flex', 'gap': '20px', 'alignItems': 'flex-end', 'marginBottom': '15px'}),
+                dcc.Graph(id='store-chart', style={'height': '500px'})
+            ], style={
+                'backgroundColor': 'white',
+                'padding': '20px',
+                'borderRadius': '10px',
+                'boxShadow': '0 4px 8px 0 rgba(0,0,0,0.2)',
+                'marginBottom': '20px'
+            }),
+
             # Cuarta fila: Gráfico de líneas de tiempo
             html.Div([
                 html.H3("Evolución del Profit a lo Largo del Tiempo", style={'color': '#2c3e50', 'marginBottom': '15px'}),
-                dcc.Graph(id='time-series-chart', style={'height': '500px'})
+                html.Div([
+                    html.Div([
+                        html.Label("Comparar Años:", style={'fontWeight': 'bold', 'marginBottom': '5px', 'display': 'block'}),
+                        dcc.Dropdown(
+                            id='ts-year-filter',
+                            options=[{'label': str(y), 'value': y} for y in YEARS],
+                            value=YEARS[:2],
+                            multi=True,
+                            style={'color': 'black'}
+                        ),
+                    ], style=FILTER_ITEM_STYLE),
+                    html.Div([
+                        html.Label("Granularidad:", style={'fontWeight': 'bold', 'marginBottom': '5px', 'display': 'block'}),
+                        dcc.RadioItems(
+                            id='ts-granularity',
+                            options=[{'label': label, 'value': freq} for freq, label in GRANULARIDADES.items()],
+                            value='D',
+                            inline=True,
+                            inputStyle={'marginRight': '5px', 'marginLeft': '10px'}
+                        ),
+                    ], style=FILTER_ITEM_STYLE),
+                ], style={'display': 'flex', 'gap': '20px', 'alignItems': 'flex-end', 'marginBottom': '15px'}),
+                dcc.Graph(id='time-series-chart', style={'height': '500px'}),
+                # Ancho en píxeles y rango visible del eje X de la serie (lo escribe el navegador)
+                dcc.Store(id='ts-viewport'),
             ], style={
                 'backgroundColor': 'white',
                 'padding': '20px',
@@ -214,46 +519,51 @@ app.layout = html.Div([
 ], style={'margin': '0 auto', 'padding': '20px'})
 
 # --- CALLBACKS (Lógica Interactiva) ---
+# Hover -> segmento seleccionado: se resuelve en el navegador (sin request al servidor).
+# Solo actualiza el Store cuando el segmento cambia, así moverse sobre la misma burbuja
+# no dispara update_drill_chart ni update_customer_table.
+app.clientside_callback(
+    """
+    function(hoverData, segmentoActual) {
+        var segmento = 'Todos';
+        if (hoverData && hoverData.points && hoverData.points.length > 0) {
+            segmento = hoverData.points[0].customdata[0];
+        }
+        if (segmento === segmentoActual) {
+            return window.dash_clientside.no_update;
+        }
+        return segmento;
+    }
+    """,
+    Output('selected-segment-store', 'data'),
+    Input('bubble-chart', 'hoverData'),
+    State('selected-segment-store', 'data')
+)
+
+# La figura de burbujas solo se reconstruye cuando cambia el año o el mes
 @app.callback(
     [Output('bubble-chart', 'figure'),
-     Output('debug-text', 'children'),
-     Output('selected-segment-store', 'data')],
+     Output('debug-text', 'children')],
     [Input('year-filter', 'value'),
-     Input('month-filter', 'value'),
-     Input('bubble-chart', 'hoverData')]
+     Input('month-filter', 'value')]
 )
-def update_graph(selected_year, selected_month, hoverData):
-    # 1. Filtrar los datos generados por Año y Mes
-    if selected_month == 0:  # "Todos" los meses
-        filtered_df = df_mensual_segmentado[df_mensual_segmentado['Year'] == selected_year]
-    else:
-        filtered_df = df_mensual_segmentado[
-            (df_mensual_segmentado['Year'] == selected_year) & 
-            (df_mensual_segmentado['Month'] == selected_month)
-        ]
-    
-    if filtered_df.empty:
-        return px.scatter(title="No hay datos para esta selección"), "Sin datos", "Todos"
-
-    # 2. Agrupar por SEGMENTO para crear las burbujas
-    # Primero agregamos a nivel de cliente dentro del período seleccionado
-    client_segment_agg = filtered_df.groupby(['CustomerKey', 'Segmento']).agg({
-        'Profit': 'sum',
-        '% Cumplimiento': 'mean',
-    }).reset_index()
+@figuras_precalculadas.servir(lambda year, month: (year, month))
+@datos.requerido
+@metricas.instrumentar
+@cache_figuras.memoizar
+def update_graph(selected_year, selected_month):
+    # 1. Buscar el período (Año, Mes) en el cubo pre-agregado (Mes 0 = "Todos")
+    metricas.fase('filtro')
+    periodo = datos.cubo_segmentos.get((selected_year, selected_month))
     
-    # Luego agregamos por segmento
-    bubble_data = client_segment_agg.groupby('Segmento').agg({
-        'Profit': 'sum',
-        '% Cumplimiento': 'mean',
-        'CustomerKey': 'count'
-    }).rename(columns={
-        'Profit': 'Total Profit (X)',
-        '% Cumplimiento': 'Avg Cumplimiento (Y)',
-        'CustomerKey': 'Num Clientes (Size)'
-    }).reset_index()
+    if periodo is None:
+        return px.scatter(title="No hay datos para esta selección"), "Sin datos"
+
+    # 2. Burbujas por SEGMENTO (ya agregadas: cliente -> segmento)
+    bubble_data = periodo['segmentos']
 
     # 3. Generar Gráfico
+    metricas.fase('figura')
     month_label = "Todos los meses" if selected_month == 0 else meses_dict[selected_month]
     
     # Crear figura con plotly graph_objects para mayor control
@@ -309,14 +619,31 @@ def update_graph(selected_year, selected_month, hoverData):
     fig.add_vline(x=0, line_dash="dash", line_color="red")
 
     month_label = "Todos los meses" if selected_month == 0 else meses_dict[selected_month]
-    debug_msg = f"Mostrando datos para {month_label} del {selected_year}. Total registros procesados: {len(filtered_df)}"
-    
-    # Extraer el segmento del hoverData (tendrá valor inicial "Todos" cuando no hay hover)
-    selected_segment = "Todos"
-    if hoverData and 'points' in hoverData and len(hoverData['points']) > 0:
-        selected_segment = hoverData['points'][0]['customdata'][0]
+    debug_msg = f"Mostrando datos para {month_label} del {selected_year}. Total registros procesados: {periodo['registros']}"
     
-    return fig, debug_msg, selected_segment
+    return fig, debug_msg
+
+# Tendencia por segmento: lectura de las grillas precalculadas (sin recorrer df_diario)
+@app.callback(
+    [Output('segment-trends-table', 'data'),
+     Output('segment-trends-title', 'children')],
+    [Input('year-filter', 'value'),
+     Input('month-filter', 'value')]
+)
+@figuras_precalculadas.servir(lambda year, month: (year, month))
+@datos.requerido
+@metricas.instrumentar
+@cache_figuras.memoizar
+def update_segment_trends(selected_year, selected_month):
+    month_label = "Todos los meses" if selected_month == 0 else meses_dict[selected_month]
+    tabla = processing.metricas_segmentos(datos.metricas_moviles, selected_year, selected_month)
+    if tabla is None:
+        return [], f"Tendencia por Segmento - {month_label} {selected_year} (sin datos)"
+    # Ventanas al cierre del período (o al último día cargado); MoM no aplica al año completo
+    tabla = tabla.round(2).astype(object).where(tabla.notna(), None)
+    parcial = " (período parcial: sin MoM/YoY)" if processing.periodo_parcial(
+        datos.metricas_moviles, selected_year, selected_month) else ""
+    return tabla.reset_index().to_dict('records'), f"Tendencia por Segmento - {month_label} {selected_year}{parcial}"
 
 # Callback para mostrar el gráfico drill-through
 @app.callback(
@@ -327,26 +654,26 @@ def update_graph(selected_year, selected_month, hoverData):
      Input('year-filter', 'value'),
      Input('month-filter', 'value')]
 )
+@figuras_precalculadas.servir(lambda segmento, year, month: (segmento or 'Todos', year, month))
+@datos.requerido
+@metricas.instrumentar
+@cache_figuras.memoizar
 def update_drill_chart(selected_segment, selected_year, selected_month):
-    # Filtrar por año y opcionalmente por mes
-    if selected_month == 0:  # "Todos" los meses
-        filtered_df = df_mensual_segmentado[df_mensual_segmentado['Year'] == selected_year]
-    else:
-        filtered_df = df_mensual_segmentado[
-            (df_mensual_segmentado['Year'] == selected_year) & 
-            (df_mensual_segmentado['Month'] == selected_month)
-        ]
+    # Período ya agregado por cliente en el cubo (el mismo que usan la gráfica y la tabla)
+    metricas.fase('filtro')
+    periodo = datos.cubo_segmentos.get((selected_year, selected_month))
+    customer_data = periodo['clientes'] if periodo is not None else pd.DataFrame()
     
     # Si el segmento es "Todos" o no hay selección, mostrar todos los clientes
     if not selected_segment or selected_segment == "Todos":
-        drill_df = filtered_df
         title_segment = "Todos"
     else:
         # Filtrar por segmento específico
-        drill_df = filtered_df[filtered_df['Segmento'] == selected_segment]
+        if not customer_data.empty:
+            customer_data = customer_data[customer_data['Segmento'] == selected_segment]
         title_segment = selected_segment
     
-    if drill_df.empty:
+    if customer_data.empty:
         empty_fig = go.Figure()
         empty_fig.update_layout(title="No hay datos para este segmento")
         style = {
@@ -359,17 +686,10 @@ def update_drill_chart(selected_segment, selected_year, selected_month):
         }
         return empty_fig, f"Detalle de Clientes - {title_segment}", style
     
-    # Agrupar por cliente
-    customer_data = drill_df.groupby(['CustomerKey', 'Name']).agg({
-        'Profit': 'sum',
-        '% Cumplimiento': 'mean',
-        'Income': 'sum',
-        'Budget Profit': 'sum'
-    }).reset_index()
-    
-    # Crear gráfico scatter
+    # Crear gráfico scatter (customdata = código del cliente, para el click del historial)
+    metricas.fase('figura')
     fig = px.scatter(
-        customer_data,
+        customer_data.assign(Codigo=customer_data['CustomerKey'].cat.codes),
         x='Profit',
         y='% Cumplimiento',
         hover_name='Name',
@@ -381,6 +701,8 @@ def update_drill_chart(selected_segment, selected_year, selected_month):
         },
         color='Profit',
         color_continuous_scale='RdYlGn',
+        render_mode='webgl' if len(customer_data) > UMBRAL_WEBGL else 'svg',
+        custom_data=['Codigo'],
         title=f"Clientes en {title_segment} - {'Todos los meses' if selected_month == 0 else meses_dict[selected_month]} {selected_year}",
         labels={
             'Profit': 'Profit (USD)',
@@ -413,47 +735,82 @@ def update_drill_chart(selected_segment, selected_year, selected_month):
     
     return fig, title_text, style
 
+# Ancho de la gráfica y rango del zoom -> Store. Se resuelve en el navegador y solo escribe el
+# Store cuando cambian, así el servidor vuelve a pedir resolución completa solo al hacer zoom.
+app.clientside_callback(
+    """
+    function(relayoutData, previo) {
+        var grafica = document.getElementById('time-series-chart');
+        // Ancho redondeado a 100 px: menos variantes de la misma figura en la cache
+        var ancho = grafica && grafica.offsetWidth ? Math.ceil(grafica.offsetWidth / 100) * 100 : null;
+        var rango = previo ? previo.rango : null;
+        if (relayoutData) {
+            if (relayoutData['xaxis.autorange']) {
+                rango = null;
+            } else if (relayoutData['xaxis.range[0]'] !== undefined) {
+                rango = [relayoutData['xaxis.range[0]'], relayoutData['xaxis.range[1]']];
+            } else if (relayoutData['xaxis.range']) {
+                rango = relayoutData['xaxis.range'];
+            }
+        }
+        if (previo && previo.ancho === ancho && JSON.stringify(previo.rango) === JSON.stringify(rango)) {
+            return window.dash_clientside.no_update;
+        }
+        return {ancho: ancho, rango: rango};
+    }
+    """,
+    Output('ts-viewport', 'data'),
+    Input('time-series-chart', 'relayoutData'),
+    State('ts-viewport', 'data')
+)
+
 # Callback para el gráfico de líneas de tiempo
 @app.callback(
     Output('time-series-chart', 'figure'),
-    [Input('year-filter', 'value')]
+    [Input('ts-year-filter', 'value'),
+     Input('ts-granularity', 'value'),
+     Input('ts-viewport', 'data')]
 )
-def update_time_series(selected_year):
-    # Agrupar datos diarios por fecha para 2024 y 2025
-    df_2024 = df_diario[df_diario['Year'] == 2024].groupby('Date').agg({
-        'Profit': 'sum'
-    }).reset_index()
+@datos.requerido
+@metricas.instrumentar
+@cache_figuras.memoizar
+def update_time_series(selected_years, granularity, viewport=None):
+    # Series precalculadas por año: no se recorre df_diario en cada request
+    years = sorted(y for y in (selected_years or []) if y in datos.series_diarias)
+    granularity_label = GRANULARIDADES.get(granularity, 'Diario')
     
-    df_2025 = df_diario[df_diario['Year'] == 2025].groupby('Date').agg({
-        'Profit': 'sum'
-    }).reset_index()
+    # Presupuesto de puntos según el ancho de la gráfica; con zoom, solo el rango visible
+    # (a resolución completa si cabe en el presupuesto)
+    viewport = viewport or {}
+    ancho = viewport.get('ancho') or ANCHO_GRAFICA_DEFECTO
+    desde, hasta = viewport.get('rango') or (None, None)
+    metricas.fase('agregacion')
+    series = {year: processing.serie_profit(datos.series_diarias, year, granularity) for year in years}
+    visibles = {year: len(serie[desde:hasta]) for year, serie in series.items()}
+    total = sum(visibles.values()) or 1
     
     # Crear figura
     fig = go.Figure()
     
-    # Línea para 2024
-    fig.add_trace(go.Scatter(
-        x=df_2024['Date'],
-        y=df_2024['Profit'],
-        mode='lines',
-        name='2024',
-        line=dict(color='#3498db', width=2),
-        hovertemplate='<b>2024</b><br>Fecha: %{x|%Y-%m-%d}<br>Profit: $%{y:,.2f}<extra></extra>'
-    ))
-    
-    # Línea para 2025
-    fig.add_trace(go.Scatter(
-        x=df_2025['Date'],
-        y=df_2025['Profit'],
-        mode='lines',
-        name='2025',
-        line=dict(color='#e74c3c', width=2),
-        hovertemplate='<b>2025</b><br>Fecha: %{x|%Y-%m-%d}<br>Profit: $%{y:,.2f}<extra></extra>'
-    ))
+    # Una línea por año seleccionado; cada año recibe puntos en proporción a su largo visible
+    for year in years:
+        metricas.fase('agregacion')
+        n_puntos = max(3, int(ancho * PUNTOS_POR_PIXEL * visibles[year] / total))
+        serie = processing.reducir_serie(series[year], n_puntos, desde, hasta)
+        metricas.fase('figura')
+        Traza = go.Scattergl if len(serie) > UMBRAL_WEBGL else go.Scatter
+        fig.add_trace(Traza(
+            x=serie.index,
+            y=serie.to_numpy(),
+            mode='lines',
+            name=str(year),
+            line=dict(color=COLORES_YEAR.get(year), width=2),
+            hovertemplate=f'<b>{year}</b><br>Fecha: %{{x|%Y-%m-%d}}<br>Profit: $%{{y:,.2f}}<extra></extra>'
+        ))
     
     # Configurar layout
     fig.update_layout(
-        title='Profit Diario - Comparación 2024 vs 2025',
+        title=f"Profit {granularity_label} - Comparación {' vs '.join(str(y) for y in years)}",
         xaxis_title='Fecha',
         yaxis_title='Profit (USD)',
         hovermode='x unified',
@@ -467,65 +824,306 @@ def update_time_series(selected_year):
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='white',
         font=dict(family='Arial, sans-serif', size=12, color='#2c3e50'),
-        margin=dict(l=50, r=50, t=80, b=50)
+        margin=dict(l=50, r=50, t=80, b=50),
+        # Conserva el zoom del usuario cuando llega la figura a resolución completa
+        uirevision=f"{'-'.join(str(y) for y in years)}-{granularity}"
     )
     
     # Agregar línea de referencia en y=0
     fig.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
     
     # Configurar ejes
-    fig.update_xaxis(showgrid=True, gridcolor='#ecf0f1')
-    fig.update_yaxis(showgrid=True, gridcolor='#ecf0f1', tickformat='$,.0f')
+    fig.update_xaxes(showgrid=True, gridcolor='#ecf0f1')
+    fig.update_yaxes(showgrid=True, gridcolor='#ecf0f1', tickformat='$,.0f')
     
     return fig
 
-# Callback para actualizar la tabla de clientes
+# Callback para actualizar la tabla de clientes (paginación, orden y búsqueda en el servidor)
 @app.callback(
-    Output('customer-table', 'data'),
+    [Output('customer-table', 'data'),
+     Output('customer-table', 'page_count'),
+     Output('customer-table', 'page_current')],
     [Input('selected-segment-store', 'data'),
      Input('year-filter', 'value'),
      Input('month-filter', 'value'),
-     Input('search-input', 'value')]
+     Input('search-input', 'value'),
+     Input('customer-table', 'page_current'),
+     Input('customer-table', 'page_size'),
+     Input('customer-table', 'sort_by')]
 )
-def update_customer_table(selected_segment, selected_year, selected_month, search_value):
-    # Filtrar por año y opcionalmente por mes
-    if selected_month == 0:  # "Todos" los meses
-        filtered_df = df_mensual_segmentado[df_mensual_segmentado['Year'] == selected_year]
-    else:
-        filtered_df = df_mensual_segmentado[
-            (df_mensual_segmentado['Year'] == selected_year) & 
-            (df_mensual_segmentado['Month'] == selected_month)
-        ]
+@figuras_precalculadas.servir(
+    # Solo la primera página con el orden por defecto y sin búsqueda (la vista inicial)
+    lambda segmento, year, month, busqueda, pagina, tamano, orden:
+        (segmento or 'Todos', year, month) if not busqueda and not pagina and tamano == 10 and not orden else None)
+@datos.requerido
+@metricas.instrumentar
+def update_customer_table(selected_segment, selected_year, selected_month, search_value,
+                          page_current=0, page_size=10, sort_by=None):
+    # Agregación por cliente del período, ya calculada en el cubo
+    metricas.fase('filtro')
+    periodo = datos.cubo_segmentos.get((selected_year, selected_month))
+    if periodo is None:
+        return [], 1, 0
+    clientes = periodo['clientes']
     
-    # Si el segmento es "Todos" o no hay selección, mostrar todos los clientes
-    if not selected_segment or selected_segment == "Todos":
-        table_df = filtered_df
+    # Orden precalculado del período (por defecto: Profit descendente)
+    if sort_by:
+        orden = periodo['ordenes'][sort_by[0]['column_id']]
+        descendente = sort_by[0]['direction'] == 'desc'
     else:
-        # Filtrar por segmento específico
-        table_df = filtered_df[filtered_df['Segmento'] == selected_segment]
+        orden = periodo['ordenes']['Profit']
+        descendente = True
+    if descendente:
+        orden = orden[::-1]
     
-    # Agrupar por cliente
-    customer_summary = table_df.groupby(['CustomerKey', 'Name', 'Segmento']).agg({
-        'Profit': 'sum'
-    }).reset_index()
-    
-    # Filtrar por búsqueda de nombre
+    # Filas visibles: segmento seleccionado y búsqueda por nombre
+    visibles = np.ones(len(clientes), dtype=bool)
+    if selected_segment and selected_segment != "Todos":
+        visibles &= (clientes['Segmento'] == selected_segment).to_numpy()
     if search_value and search_value.strip():
-        customer_summary = customer_summary[
-            customer_summary['Name'].str.contains(search_value, case=False, na=False)
-        ]
-    
-    # Ordenar por Profit descendente
-    customer_summary = customer_summary.sort_values('Profit', ascending=False)
+        ids = processing.buscar_nombres(datos.indice_nombres, search_value)
+        visibles &= np.isin(clientes['CustomerKey'].cat.codes.to_numpy(), ids)
+    orden = orden[visibles[orden]]
     
-    # Seleccionar solo las columnas necesarias
-    customer_summary = customer_summary[['Name', 'Segmento', 'Profit']]
+    # Solo se serializa la página actual
+    metricas.fase('tabla')
+    page_size = page_size or 10
+    page_count = max(1, -(-len(orden) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    pagina = orden[page_current * page_size:(page_current + 1) * page_size]
     
-    return customer_summary.to_dict('records')
+    # 'id' (código del cliente) llega como row_id en active_cell al hacer click en una fila
+    filas = clientes.iloc[pagina]
+    registros = filas[processing.COLUMNAS_TABLA].assign(id=filas['CustomerKey'].cat.codes).to_dict('records')
+    return registros, page_count, page_current
+
+# Click en un cliente del drill-down o en una fila de la tabla -> cliente seleccionado.
+# Se resuelve en el navegador: el Store solo cambia cuando cambia el cliente.
+app.clientside_callback(
+    """
+    function(clickData, activeCell, clienteActual) {
+        var disparo = window.dash_clientside.callback_context.triggered[0];
+        var cliente = null;
+        if (disparo && disparo.prop_id === 'drill-chart.clickData' && clickData && clickData.points.length > 0) {
+            cliente = clickData.points[0].customdata[0];
+        } else if (disparo && disparo.prop_id === 'customer-table.active_cell' && activeCell) {
+            cliente = activeCell.row_id;
+        }
+        if (cliente === null || cliente === undefined || cliente === clienteActual) {
+            return window.dash_clientside.no_update;
+        }
+        return cliente;
+    }
+    """,
+    Output('selected-customer-store', 'data'),
+    Input('drill-chart', 'clickData'),
+    Input('customer-table', 'active_cell'),
+    State('selected-customer-store', 'data')
+)
+
+# Historial diario del cliente: Profit diario y Profit Acumulado vs Budget Profit Acumulado (YTD).
+# Lee solo las filas del cliente gracias al índice de offsets (no recorre df_diario).
+@app.callback(
+    [Output('customer-history-chart', 'figure'),
+     Output('customer-history-title', 'children')],
+    Input('selected-customer-store', 'data')
+)
+@datos.requerido
+@metricas.instrumentar
+@cache_figuras.memoizar
+def update_customer_history(cliente):
+    if cliente is None:
+        fig = go.Figure()
+        fig.update_layout(title="Haz click en un cliente del detalle o de la tabla para ver su historial")
+        return fig, "Historial del Cliente"
+
+    metricas.fase('filtro')
+    cliente = int(cliente)
+    historial = processing.historial_cliente(datos.df_diario, datos.indice_clientes, cliente)
+    nombre = datos.dim_clientes['Name'].iloc[cliente] if 0 <= cliente < len(datos.dim_clientes) else cliente
+
+    metricas.fase('figura')
+    # Dos paneles que comparten el eje X: acumulados arriba (y) y Profit diario abajo (y2).
+    # Se arma el layout directamente: make_subplots cuesta más que todo el resto de la figura.
+    Traza = go.Scattergl if len(historial) > UMBRAL_WEBGL else go.Scatter
+    fechas = historial['Date'].to_numpy()
+    profit = historial['Profit'].to_numpy()
+    ejes = dict(showgrid=True, gridcolor='#ecf0f1', tickformat='$,.0f')
+    fig = go.Figure(
+        data=[
+            Traza(x=fechas, y=historial['Profit Acumulado'].to_numpy(), mode='lines',
+                  name='Profit Acumulado', line=dict(color='#27ae60', width=2),
+                  hovertemplate='Fecha: %{x|%Y-%m-%d}<br>Profit Acumulado: $%{y:,.2f}<extra></extra>'),
+            Traza(x=fechas, y=historial['Budget Profit Acumulado'].to_numpy(), mode='lines',
+                  name='Budget Profit Acumulado', line=dict(color='#7f8c8d', width=2, dash='dash'),
+                  hovertemplate='Fecha: %{x|%Y-%m-%d}<br>Budget Acumulado: $%{y:,.2f}<extra></extra>'),
+            go.Bar(x=fechas, y=profit, name='Profit diario', yaxis='y2',
+                   marker_color=np.where(profit >= 0, '#3498db', '#e74c3c'),
+                   hovertemplate='Fecha: %{x|%Y-%m-%d}<br>Profit: $%{y:,.2f}<extra></extra>'),
+        ],
+        layout=dict(
+            title=f"{nombre}: Profit Acumulado (YTD) vs Budget y Profit diario",
+            xaxis=dict(anchor='y2', showgrid=True, gridcolor='#ecf0f1'),
+            yaxis=dict(domain=[0.4, 1], **ejes),
+            yaxis2=dict(domain=[0, 0.33], anchor='x', **ejes),
+            hovermode='x unified',
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='white',
+            font=dict(family='Arial, sans-serif', size=12, color='#2c3e50'),
+            margin=dict(l=50, r=50, t=80, b=50)
+        ),
+    )
+
+    return fig, f"Historial del Cliente - {nombre}"
+
+# Enlaces de exportación con la selección actual (se arman en el navegador, sin request)
+app.clientside_callback(
+    """
+    function(segmento, year, month) {
+        var base = '/export?year=' + year + '&month=' + month +
+                   '&segmento=' + encodeURIComponent(segmento || 'Todos');
+        return [base + '&tabla=mensual&formato=csv',
+                base + '&tabla=diario&formato=csv',
+                base + '&tabla=diario&formato=parquet'];
+    }
+    """,
+    [Output('export-mensual-csv', 'href'),
+     Output('export-diario-csv', 'href'),
+     Output('export-diario-parquet', 'href')],
+    [Input('selected-segment-store', 'data'),
+     Input('year-filter', 'value'),
+     Input('month-filter', 'value')]
+)
+
+# Opciones del filtro de tiendas según las zonas elegidas (descarta tiendas de otras zonas)
+@app.callback(
+    [Output('store-filter', 'options'),
+     Output('store-filter', 'value')],
+    Input('zone-filter', 'value'),
+    State('store-filter', 'value')
+)
+@datos.requerido
+def update_store_options(zonas, tiendas):
+    dim_tiendas = datos.dim_tiendas
+    if zonas:
+        dim_tiendas = dim_tiendas[dim_tiendas['Zona'].isin(zonas)]
+    opciones = [{'label': desc, 'value': key}
+                for key, desc in zip(dim_tiendas['StoreKey'], dim_tiendas['Store Description'])]
+    visibles = set(dim_tiendas['StoreKey'])
+    return opciones, [t for t in (tiendas or []) if t in visibles]
+
+# Profit por tienda (apilado por segmento) vs Budget, desde el agregado precalculado por
+# (Year, Month, Tienda, Segmento): los filtros de tienda y zona no recorren df_diario.
+@app.callback(
+    Output('store-chart', 'figure'),
+    [Input('year-filter', 'value'),
+     Input('month-filter', 'value'),
+     Input('zone-filter', 'value'),
+     Input('store-filter', 'value')]
+)
+@datos.requerido
+@metricas.instrumentar
+@cache_figuras.memoizar
+def update_store_chart(selected_year, selected_month, zonas, tiendas):
+    metricas.fase('filtro')
+    filas = processing.cortar_periodo(datos.periodos_tiendas, selected_year, selected_month)
+    if filas is not None and zonas:
+        filas = filas[filas['Zona'].isin(zonas)]
+    if filas is not None and tiendas:
+        filas = filas[filas['StoreKey'].isin(tiendas)]
+    if filas is None or filas.empty:
+        fig = go.Figure()
+        fig.update_layout(title="No hay datos para esta selección")
+        return fig
+
+    metricas.fase('agregacion')
+    por_segmento = filas.groupby(['Store Description', 'Segmento'], observed=True)['Profit'].sum().reset_index()
+    por_tienda = filas.groupby(['Store Description', 'Zona'], observed=True)[
+        ['Profit', 'Budget Profit', 'Suma Cumplimiento', 'Registros']].sum().reset_index()
+    por_tienda['% Cumplimiento'] = por_tienda['Suma Cumplimiento'] / por_tienda['Registros']
+
+    metricas.fase('figura')
+    fig = go.Figure()
+    # Barras de Profit por tienda, apiladas por segmento de cliente
+    for segmento, grupo in por_segmento.groupby('Segmento', observed=True):
+        fig.add_trace(go.Bar(
+            x=grupo['Store Description'].astype(str), y=grupo['Profit'].to_numpy(), name=str(segmento),
+            hovertemplate=f'<b>%{{x}}</b><br>{segmento}<br>Profit: $%{{y:,.0f}}<extra></extra>'
+        ))
+    # Budget total de cada tienda como marcador
+    fig.add_trace(go.Scatter(
+        x=por_tienda['Store Description'].astype(str), y=por_tienda['Budget Profit'].to_numpy(),
+        mode='markers', name='Budget Profit', marker=dict(symbol='line-ew-open', size=40, color='#2c3e50', line=dict(width=3)),
+        customdata=np.column_stack([por_tienda['Profit'], por_tienda['% Cumplimiento'], por_tienda['Zona'].astype(str)]),
+        hovertemplate='<b>%{x}</b> (Zona %{customdata[2]})<br>Budget: $%{y:,.0f}<br>'
+                      'Profit: $%{customdata[0]:,.0f}<br>Cumplimiento promedio: %{customdata[1]:.1f}%<extra></extra>'
+    ))
+    month_label = "Todos los meses" if selected_month == 0 else meses_dict[selected_month]
+    fig.update_layout(
+        title=f"Profit por Tienda vs Budget - {month_label} {selected_year}",
+        barmode='relative',
+        xaxis_title='Tienda',
+        yaxis=dict(title='Profit (USD)', tickformat='$,.0f', showgrid=True, gridcolor='#ecf0f1'),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='white',
+        font=dict(family='Arial, sans-serif', size=12, color='#2c3e50'),
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    fig.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
+
+    return fig
+
+# --- PRECÁLCULO DE ESTADOS ---
+def estados_precalculables():
+    """(callback, estado) de cada salida precalculable: año x mes (0-12) x segmento ("Todos" + segmentos)."""
+    segmentos = ['Todos'] + list(datos.df_mensual_segmentado['Segmento'].cat.categories)
+    for year in YEARS:
+        for month in range(13):
+            yield 'update_graph', (year, month)
+            yield 'update_segment_trends', (year, month)
+            for segmento in segmentos:
+                yield 'update_drill_chart', (segmento, year, month)
+                yield 'update_customer_table', (segmento, year, month)
+
+def _precalcular_estado(directorio, callback, estado):
+    # La función original, sin cache ni métricas (las capas de arriba son para requests)
+    func = inspect.unwrap(globals()[callback])
+    args = estado + (None, 0, 10, None) if callback == 'update_customer_table' else estado
+    return FigurasPrecalculadas.escribir(directorio, callback, estado, func(*args))
+
+def precalcular_estados(directorio, workers=1):
+    """
+    Escribe en `directorio` la salida de cada estado precalculable y al final el manifiesto
+    (namespace de los datos y del código). Con `workers` > 1 los estados se reparten entre procesos
+    (fork: heredan los datos ya cargados).
+    """
+    datos.esperar()
+    estados = list(estados_precalculables())
+    inicio = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            tamanos = list(pool.map(_precalcular_estado, repeat(directorio), *zip(*estados), chunksize=8))
+    else:
+        tamanos = [_precalcular_estado(directorio, callback, estado) for callback, estado in estados]
+    with open(os.path.join(directorio, MANIFIESTO_PRECALCULADO), 'w') as f:
+        json.dump({'namespace': cache_figuras.namespace, 'estados': len(estados), 'bytes': sum(tamanos)}, f)
+    return len(estados), sum(tamanos), time.perf_counter() - inicio
 
 if __name__ == '__main__':
-    # Ejecutar en modo debug para desarrollo local, producción para deploy
-    import os
-    debug_mode = os.environ.get('DASH_DEBUG', 'True') == 'True'
-    port = int(os.environ.get('PORT', 8050))
-    app.run(debug=debug_mode, host='0.0.0.0', port=port)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="GoData Financial Dashboard.")
+    parser.add_argument('--precalcular', metavar='DIR',
+                        help="Precalcula las figuras y tablas de cada estado de los filtros en DIR y termina.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Procesos para --precalcular.")
+    args = parser.parse_args()
+    if args.precalcular:
+        n, tamano, segundos = precalcular_estados(args.precalcular, workers=args.workers)
+        print(f"{n} estados precalculados en {args.precalcular} ({tamano / 1e6:.1f} MB, {segundos:.1f} s)")
+    else:
+        # Ejecutar en modo debug para desarrollo local, producción para deploy
+        debug_mode = os.environ.get('DASH_DEBUG', 'True') == 'True'
+        port = int(os.environ.get('PORT', 8050))
+        app.run(debug=debug_mode, host='0.0.0.0', port=port)
\ No newline at end of file
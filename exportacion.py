@@ -0,0 +1,122 @@
+"""
+Exportación en streaming (CSV o Parquet) de las filas detrás de la selección del dashboard.
+
+Las filas se recorren por bloques de posiciones: cada bloque se materializa, se codifica y
+se envía antes de pasar al siguiente, así la memoria queda acotada por un bloque sin
+importar cuántas filas tenga la exportación. Parquet requiere pyarrow (opcional).
+"""
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sin él solo se exporta CSV
+    pa = pq = None
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def formato_disponible(formato):
+    return formato == 'csv' or (formato == 'parquet' and pq is not None)
+
+
+def _bloque(df, posiciones, columnas):
+    # Columna por columna: df.iloc[filas, cols] consolida los bloques internos del frame
+    # (una copia de la tabla completa) antes de tomar las filas
+    return pd.DataFrame({col: df[col].take(posiciones).reset_index(drop=True) for col in columnas},
+                        columns=columnas)
+
+
+def bloques_csv(df, bloques_posiciones, columnas):
+    """Bytes CSV (UTF-8) bloque por bloque; el encabezado va solo en el primero."""
+    primero = True
+    for posiciones in bloques_posiciones:
+        yield _bloque(df, posiciones, columnas).to_csv(index=False, header=primero).encode('utf-8')
+        primero = False
+    if primero:
+        # Sin filas: solo el encabezado
+        yield (','.join(columnas) + '\n').encode('utf-8')
+
+
+class _Sumidero:
+    """Archivo de solo escritura que acumula lo escrito hasta que el generador lo drena."""
+
+    def __init__(self):
+        self.partes = []
+        self.posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self.partes.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def bloques_parquet(df, bloques_posiciones, columnas):
+    """Bytes Parquet: un row group por bloque, escritos en streaming; el footer va al final."""
+    sumidero = _Sumidero()
+    escritor = None
+    for posiciones in bloques_posiciones:
+        tabla = pa.Table.from_pandas(_bloque(df, posiciones, columnas), preserve_index=False)
+        if escritor is None:
+            escritor = pq.ParquetWriter(sumidero, tabla.schema)
+        escritor.write_table(tabla)
+        datos = sumidero.drenar()
+        if datos:
+            yield datos
+    if escritor is None:
+        escritor = pq.ParquetWriter(sumidero, pa.Schema.from_pandas(_bloque(df, [], columnas), preserve_index=False))
+    escritor.close()
+    yield sumidero.drenar()
+
+
+class LimiteExportaciones:
+    """Máximo de exportaciones simultáneas por proceso, para no ocupar todos los hilos."""
+
+    def __init__(self, maximo):
+        self._semaforo = threading.BoundedSemaphore(maximo)
+
+    def adquirir(self):
+        return self._semaforo.acquire(blocking=False)
+
+    def envolver(self, bloques):
+        """Iterable de respuesta que libera el cupo al terminar o al cerrarse (cliente que corta)."""
+        return _RespuestaConCupo(bloques, self._semaforo)
+
+
+class _RespuestaConCupo:
+    # El servidor WSGI siempre llama close(), también si nunca empezó a iterar
+    def __init__(self, bloques, semaforo):
+        self._bloques = bloques
+        self._semaforo = semaforo
+        self._liberado = False
+
+    def __iter__(self):
+        return iter(self._bloques)
+
+    def close(self):
+        if hasattr(self._bloques, 'close'):
+            self._bloques.close()
+        if not self._liberado:
+            self._liberado = True
+            self._semaforo.release()
@@ -0,0 +1,28 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo).
+import gc
+import os
+import sys
+
+# Modo preload: el master importa `dashboard` y construye los DataFrames una sola vez
+# antes de hacer fork. Los workers comparten esas páginas por copy-on-write en lugar
+# de tener cada uno su propia copia de df_diario y df_mensual_segmentado.
+# Desactivar con GODATA_PRELOAD=False.
+preload_app = os.environ.get('GODATA_PRELOAD', 'True') == 'True'
+
+# Hilos por worker (worker gthread): una descarga de /export en streaming ocupa un hilo
+# mientras transmite, sin bloquear los callbacks de Dash que atiende el mismo worker.
+threads = int(os.environ.get('GODATA_THREADS', 4))
+
+
+def when_ready(server):
+    if preload_app:
+        # El master termina la carga antes del fork y los workers heredan los datos y sus
+        # estructuras derivadas por copy-on-write. Con snapshot es un mmap de pocos segundos;
+        # sin snapshot es el ETL completo. Nunca se hace fork con el hilo de carga vivo.
+        dashboard = sys.modules.get('dashboard')
+        if dashboard is not None:
+            dashboard.datos.esperar_hilo()
+        # Mover los objetos del master a la generación permanente: el GC de los workers
+        # no los recorre ni escribe sus cabeceras, así sus páginas siguen compartidas.
+        gc.collect()
+        gc.freeze()
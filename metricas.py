@@ -0,0 +1,150 @@
+"""
+Instrumentación de los callbacks del dashboard en formato Prometheus.
+
+Por callback se registra el tiempo total, el tiempo por fase (filtro, agregación, armado
+de la figura), el tiempo del request completo y el tamaño de la respuesta serializada.
+Las métricas son por proceso: con varios workers de gunicorn cada uno expone las suyas.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from dash.exceptions import PreventUpdate
+
+logger = logging.getLogger('godata.callbacks')
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_BYTES = (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+
+class _Histograma:
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre, self.ayuda, self.buckets = nombre, ayuda, buckets
+        self.conteos = defaultdict(lambda: [0] * len(buckets))
+        self.sumas = defaultdict(float)
+        self.totales = defaultdict(int)
+
+    def observar(self, etiqueta, valor):
+        conteos = self.conteos[etiqueta]
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                conteos[i] += 1
+        self.sumas[etiqueta] += valor
+        self.totales[etiqueta] += 1
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for etiqueta in sorted(self.totales):
+            for limite, conteo in zip(self.buckets, self.conteos[etiqueta]):
+                lineas.append(f'{self.nombre}_bucket{{callback="{etiqueta}",le="{limite}"}} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{{callback="{etiqueta}",le="+Inf"}} {self.totales[etiqueta]}')
+            lineas.append(f'{self.nombre}_sum{{callback="{etiqueta}"}} {self.sumas[etiqueta]}')
+            lineas.append(f'{self.nombre}_count{{callback="{etiqueta}"}} {self.totales[etiqueta]}')
+        return lineas
+
+
+class MetricasCallbacks:
+    def __init__(self, umbral_lento_ms=None):
+        # Con `umbral_lento_ms` se loguean (warning) los callbacks más lentos, con sus entradas
+        self.umbral_lento_ms = umbral_lento_ms
+        self.duracion = _Histograma('godata_callback_duracion_segundos',
+                                    "Tiempo de ejecución del callback.", BUCKETS_SEGUNDOS)
+        self.request = _Histograma('godata_callback_request_segundos',
+                                   "Tiempo del request completo, incluida la serialización de Dash.",
+                                   BUCKETS_SEGUNDOS)
+        self.respuesta = _Histograma('godata_callback_respuesta_bytes',
+                                     "Tamaño de la respuesta serializada.", BUCKETS_BYTES)
+        self.fases = defaultdict(float)
+        self.errores = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def instrumentar(self, func):
+        """Decorador para callbacks; va debajo de `app.callback` y encima de la cache."""
+        @functools.wraps(func)
+        def wrapper(*args):
+            medicion = {'callback': func.__name__, 'fases': {}, 'fase': None}
+            self._local.medicion = medicion
+            inicio = time.perf_counter()
+            try:
+                return func(*args)
+            except PreventUpdate:
+                raise
+            except Exception:
+                with self._lock:
+                    self.errores[func.__name__] += 1
+                raise
+            finally:
+                fin = time.perf_counter()
+                self._cerrar_fase(medicion, fin)
+                self._registrar(medicion, fin - inicio, args)
+        return wrapper
+
+    def fase(self, nombre):
+        """
+        Marca el inicio de una fase del callback en curso: el tiempo hasta la siguiente
+        fase (o hasta el final del callback) se cuenta como `nombre`.
+        """
+        medicion = getattr(self._local, 'medicion', None)
+        if medicion is None:
+            return
+        ahora = time.perf_counter()
+        self._cerrar_fase(medicion, ahora)
+        medicion['fase'] = (nombre, ahora)
+
+    @staticmethod
+    def _cerrar_fase(medicion, ahora):
+        if medicion['fase'] is not None:
+            nombre, desde = medicion['fase']
+            medicion['fases'][nombre] = medicion['fases'].get(nombre, 0.0) + ahora - desde
+            medicion['fase'] = None
+
+    def _registrar(self, medicion, segundos, args):
+        nombre = medicion['callback']
+        with self._lock:
+            self.duracion.observar(nombre, segundos)
+            for fase, t in medicion['fases'].items():
+                self.fases[(nombre, fase)] += t
+        if self.umbral_lento_ms is not None and segundos * 1000 >= self.umbral_lento_ms:
+            fases = ', '.join(f"{fase}={t * 1000:.1f}ms" for fase, t in medicion['fases'].items())
+            logger.warning("Callback lento %s: %.1f ms (%s) entradas=%s", nombre, segundos * 1000,
+                           fases or 'sin fases', json.dumps(args, default=str)[:500])
+
+    def registrar_en(self, server, ruta_callbacks='/_dash-update-component'):
+        """Mide en Flask el request completo y los bytes de la respuesta de cada callback."""
+        from flask import request
+
+        @server.before_request
+        def _inicio_request():
+            if request.path.endswith(ruta_callbacks):
+                self._local.medicion = None
+                self._local.inicio_request = time.perf_counter()
+
+        @server.after_request
+        def _fin_request(response):
+            if request.path.endswith(ruta_callbacks):
+                medicion = getattr(self._local, 'medicion', None)
+                if medicion is not None:
+                    segundos = time.perf_counter() - self._local.inicio_request
+                    bytes_ = response.calculate_content_length() or 0
+                    with self._lock:
+                        self.request.observar(medicion['callback'], segundos)
+                        self.respuesta.observar(medicion['callback'], bytes_)
+            return response
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            lineas = self.duracion.exportar() + self.request.exportar() + self.respuesta.exportar()
+            lineas += ["# HELP godata_callback_fase_segundos_total Tiempo acumulado por fase del callback.",
+                       "# TYPE godata_callback_fase_segundos_total counter"]
+            for (nombre, fase), t in sorted(self.fases.items()):
+                lineas.append(f'godata_callback_fase_segundos_total{{callback="{nombre}",fase="{fase}"}} {t}')
+            lineas += ["# HELP godata_callback_errores_total Callbacks que terminaron con excepción.",
+                       "# TYPE godata_callback_errores_total counter"]
+            for nombre, n in sorted(self.errores.items()):
+                lineas.append(f'godata_callback_errores_total{{callback="{nombre}"}} {n}')
+        return '\n'.join(lineas) + '\n'
@@ -1,134 +1,308 @@
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-def generar_base_datos():
-    print("Generando datos simulados (ETL)... Por favor espere.")
-    np.random.seed(42)
+import nucleos
 
-    # --- 1. CONFIGURACIÓN INICIAL ---
-    start_date = datetime.date(2024, 1, 1)
-    end_date = datetime.date(2026, 12, 31)
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    n_customers = 300
-    n_stores = 8
-    
+# Directorio por defecto de los snapshots columnares (ver `construir_snapshot`)
+SNAPSHOT_DIR = os.environ.get('GODATA_SNAPSHOT_DIR', 'snapshot')
+# Incrementar cuando cambie la lógica de generación para invalidar snapshots viejos
+VERSION_SNAPSHOT = 3
+
+# Ventana de fechas por defecto de la base simulada
+FECHA_INICIO = datetime.date(2024, 1, 1)
+FECHA_FIN = datetime.date(2026, 12, 31)
+
+# Parámetros de escala de la base simulada. Se pueden cambiar por variables de entorno
+# (ver `parametros_escala`) y forman parte de la clave del snapshot.
+ESCALA_POR_DEFECTO = {
+    'n_clientes': 300,
+    'n_tiendas': 8,
+    'tasa_actividad': 0.4,   # fracción de clientes con compras cada día
+    'fecha_inicio': FECHA_INICIO,
+    'fecha_fin': FECHA_FIN,
+}
+
+# Regímenes mensuales de tendencia (Escenario 2.1), indexados por número de mes.
+# Meses Positivos: 12 (Diciembre), 6 (Junio)
+# Meses Negativos: 1 (Enero), 2 (Febrero)
+# Meses Mixtos: Resto
+BIAS_PROFIT_MES = np.array([0, -5000, -5000, 1000, 1000, 1000, 8000, 1000, 1000, 1000, 1000, 1000, 8000], dtype=float)
+VOLATILIDAD_MES = np.array([0, 2000, 2000, 6000, 6000, 6000, 1000, 6000, 6000, 6000, 6000, 6000, 1000], dtype=float)
+
+# Zonas geográficas de las tiendas simuladas
+ZONAS = ['Norte', 'Sur', 'Centro']
+
+# Tabla de hechos diaria. CustomerKey/Name y StoreKey/Store Description son categorías
+# (diccionario): sus códigos enteros son la clave sustituta del cliente/tienda y son los
+# mismos en la clave y en su descripción. Ver `construir_dimensiones`.
+COLUMNAS_DIARIAS = [
+    'DateKey', 'Date', 'Year', 'Month', 'Day',
+    'CustomerKey', 'Name', 'StoreKey', 'Store Description',
+    'UnitCost', 'UnitPrice', 'SalesQuantity', 'Income', 'Expense', 'Profit', 'Budget Profit', '% Cumplimiento'
+]
+
+def _generar_filas(date_range, rng, customers, customer_names, stores, store_desc, tasa_actividad=0.4):
+    """
+    Motor vectorizado: genera todas las filas diarias de `date_range` en bloque.
+    Cada métrica se extrae como un arreglo completo de NumPy en lugar de fila a fila.
+    """
+    n_days = len(date_range)
+    n_customers = len(customers)
+    n_stores = len(stores)
+    n_active = int(n_customers * tasa_actividad)
+    n_rows = n_days * n_active
+
+    # Muestra de clientes activos por día (sin reemplazo dentro de cada día):
+    # los `n_active` menores de una permutación aleatoria por fila.
+    daily_active = np.argpartition(rng.random((n_days, n_customers)), n_active - 1, axis=1)[:, :n_active]
+    cust_idx = daily_active.ravel()
+    day_idx = np.repeat(np.arange(n_days), n_active)
+
+    months = date_range.month.to_numpy(dtype=np.int64)[day_idx]
+    bias_profit = BIAS_PROFIT_MES[months]
+    volatility = VOLATILIDAD_MES[months]
+
+    store_idx = rng.integers(0, n_stores, size=n_rows)
+
+    # Generación de métricas base
+    sales_qty = rng.integers(1, 50, size=n_rows)
+    unit_cost = rng.uniform(10, 100, size=n_rows)
+
+    # El precio unitario debe permitir el profit bias (Cost + Margin)
+    target_margin_per_unit = rng.normal(bias_profit, volatility) / sales_qty
+    unit_price = unit_cost + target_margin_per_unit
+    # UnitPrice no puede ser negativo: precio simbólico si la pérdida es extrema
+    unit_price[unit_price < 0] = 1
+
+    income = unit_price * sales_qty
+    expense = unit_cost * sales_qty
+    profit = income - expense
+
+    # Budget Profit (presupuesto optimista; si el profit es negativo, el budget era positivo)
+    # y % Cumplimiento (50-100 con ganancia, 0-50 con pérdida, 0-100 si no hay budget) en una pasada
+    budget_profit, perc_cumplimiento = nucleos.derivar_budget_cumplimiento(
+        profit, rng.random(n_rows), rng.random(n_rows))
+
+    years = date_range.year.to_numpy(dtype=np.int64)[day_idx]
+    days = date_range.day.to_numpy(dtype=np.int64)[day_idx]
+
+    return pd.DataFrame({
+        'DateKey': years * 10000 + months * 100 + days,
+        'Date': date_range.to_numpy()[day_idx],
+        'Year': years,
+        'Month': months,
+        'Day': days,
+        'CustomerKey': pd.Categorical.from_codes(cust_idx, customers),
+        'Name': pd.Categorical.from_codes(cust_idx, customer_names),
+        'StoreKey': pd.Categorical.from_codes(store_idx, stores),
+        'Store Description': pd.Categorical.from_codes(store_idx, store_desc),
+        'UnitCost': unit_cost,
+        'UnitPrice': unit_price,
+        'SalesQuantity': sales_qty,
+        'Income': income,
+        'Expense': expense,
+        'Profit': profit,
+        'Budget Profit': budget_profit,
+        '% Cumplimiento': perc_cumplimiento,
+    }, columns=COLUMNAS_DIARIAS)
+
+def _catalogo(rng, n_customers=300, n_stores=8):
+    """Claves y descripciones de clientes y tiendas (la zona de cada tienda es aleatoria)."""
     customers = [f"CLT-{i:03d}" for i in range(1, n_customers + 1)]
     customer_names = [f"Cliente {i}" for i in range(1, n_customers + 1)]
     stores = [f"STR-{i:02d}" for i in range(1, n_stores + 1)]
-    store_desc = [f"Almacén {i} - Zona {np.random.choice(['Norte', 'Sur', 'Centro'])}" for i in range(1, n_stores + 1)]
+    zonas = rng.choice(ZONAS, size=n_stores)
+    store_desc = [f"Almacén {i} - Zona {zona}" for i, zona in zip(range(1, n_stores + 1), zonas)]
+    return customers, customer_names, stores, store_desc
 
-    records = []
+def _acumular_ytd(df, acumulados=None):
+    """
+    Ordena `df` por Cliente y Fecha y calcula los acumulados YTD (reinician cada año),
+    partiendo de `acumulados`: el último acumulado por (Year, código de cliente) de los
+    datos anteriores. Devuelve (df, acumulados actualizados).
+    """
+    # Ordenamos por Cliente (código entero de la categoría) y Fecha
+    cliente = df['CustomerKey'].cat.codes.to_numpy()
+    orden = nucleos.orden_cliente_fecha(cliente, df['Date'].to_numpy())
+    df = df.take(orden)
+    cliente = cliente[orden]
+    year = df['Year'].to_numpy()
 
-    # --- 2. GENERACIÓN FILA A FILA (Diaria) ---
-    # Para cumplir 1.3.1 (combinación única), iteramos por fechas y seleccionamos un subset de clientes
-    
-    for single_date in date_range:
-        year = single_date.year
-        month = single_date.month
-        day = single_date.day
-        date_key = int(single_date.strftime('%Y%m%d'))
-
-        # Escenario 2.1: Manipulación de tendencias por mes para forzar positivos/negativos
-        # Meses Positivos: 12 (Diciembre), 6 (Junio)
-        # Meses Negativos: 1 (Enero), 2 (Febrero)
-        # Meses Mixtos: Resto
-        
-        bias_profit = 0
-        if month in [12, 6]: 
-            bias_profit = 8000  # Tendencia muy positiva
-            volatility = 1000
-        elif month in [1, 2]:
-            bias_profit = -5000 # Tendencia negativa
-            volatility = 2000
-        else:
-            bias_profit = 1000  # Mixto / levemente positivo
-            volatility = 6000   # Alta volatilidad para tener pos y neg
-
-        # Seleccionamos aleatoriamente 40% de clientes activos por día para no hacer la base pesada innecesariamente
-        daily_active_customers = np.random.choice(range(n_customers), size=int(n_customers * 0.4), replace=False)
-
-        for idx in daily_active_customers:
-            cust_key = customers[idx]
-            cust_name = customer_names[idx]
-            
-            store_idx = np.random.randint(0, n_stores)
-            store_key = stores[store_idx]
-            store_d = store_desc[store_idx]
-
-            # Generación de métricas base
-            sales_qty = np.random.randint(1, 50)
-            unit_cost = np.random.uniform(10, 100)
-            
-            # El precio unitario debe permitir el profit bias
-            # Base price + margen aleatorio + bias distribuido en la cantidad
-            target_margin_per_unit = (np.random.normal(bias_profit, volatility) / sales_qty) 
-            # Aseguramos que el UnitPrice tenga sentido matematico (Cost + Margin)
-            unit_price = unit_cost + target_margin_per_unit
-            
-            # Ajuste: UnitPrice no puede ser negativo en la vida real (aunque el profit sí)
-            # Para simplificar el modelo matemático del profit negativo, permitiremos que el Costo supere al Precio
-            if unit_price < 0: unit_price = 1 # Precio simbólico bajo si la perdida es extrema
-
-            income = unit_price * sales_qty
-            expense = unit_cost * sales_qty
-            profit = income - expense
-
-            # Budget Profit: Simulamos que el presupuesto era optimista
-            # Si el profit es negativo, el budget probablemente era positivo
-            budget_profit = profit * np.random.uniform(0.9, 1.2) if profit > 0 else abs(profit) * 0.5 
-            
-            # % Cumplimiento distribuido aleatoriamente entre 0 y 100
-            if budget_profit == 0:
-                perc_cumplimiento = np.random.uniform(0, 100)
-            elif profit >= 0:
-                # Cuando hay ganancia, cumplimiento entre 50 y 100
-                perc_cumplimiento = np.random.uniform(50, 100)
-            else:
-                # Cuando hay pérdida, cumplimiento entre 0 y 50
-                perc_cumplimiento = np.random.uniform(0, 50)
-
-            records.append([
-                date_key, single_date, year, month, day, 
-                cust_key, cust_name, store_key, store_d,
-                unit_cost, unit_price, sales_qty, income, expense, profit, budget_profit, perc_cumplimiento
-            ])
-
-    # Crear DataFrame
-    columns = [
-        'DateKey', 'Date', 'Year', 'Month', 'Day',
-        'CustomerKey', 'Name', 'StoreKey', 'Store Description',
-        'UnitCost', 'UnitPrice', 'SalesQuantity', 'Income', 'Expense', 'Profit', 'Budget Profit', '% Cumplimiento'
-    ]
-    df = pd.DataFrame(records, columns=columns)
+    # Ambos acumulados en una pasada, reiniciando en cada (Cliente, Año); el último acumulado
+    # de cada grupo es su total
+    columnas = ['Profit', 'Budget Profit']
+    acumulado, fines = nucleos.acumular_por_grupo(cliente, year, np.vstack([df[col].to_numpy() for col in columnas]))
+    totales = pd.DataFrame(acumulado[:, fines].T, columns=columnas,
+                           index=pd.MultiIndex.from_arrays([year[fines], cliente[fines]])).sort_index()
+    if acumulados is not None and len(acumulados):
+        previo = acumulados.reindex(pd.MultiIndex.from_arrays([year, cliente]), fill_value=0)
+        acumulado += previo[columnas].to_numpy().T
+        totales = acumulados.add(totales, fill_value=0)
+    df['Profit Acumulado'] = acumulado[0]
+    df['Budget Profit Acumulado'] = acumulado[1]
+    return df, totales
+
+def parametros_escala(entorno=os.environ):
+    """
+    Parámetros de escala de `generar_base_datos`: los valores por defecto, sobrescritos por
+    GODATA_CLIENTES, GODATA_TIENDAS, GODATA_TASA_ACTIVIDAD, GODATA_FECHA_INICIO y GODATA_FECHA_FIN.
+    """
+    escala = dict(ESCALA_POR_DEFECTO)
+    for clave, variable, tipo in [
+        ('n_clientes', 'GODATA_CLIENTES', int),
+        ('n_tiendas', 'GODATA_TIENDAS', int),
+        ('tasa_actividad', 'GODATA_TASA_ACTIVIDAD', float),
+        ('fecha_inicio', 'GODATA_FECHA_INICIO', datetime.date.fromisoformat),
+        ('fecha_fin', 'GODATA_FECHA_FIN', datetime.date.fromisoformat),
+    ]:
+        if entorno.get(variable):
+            escala[clave] = tipo(entorno[variable])
+    return escala
+
+def _generar_particion(fechas, seed, catalogo, tasa_actividad=0.4):
+    """
+    Filas de una partición mensual. Su semilla depende solo de (seed, año, mes), así el
+    resultado es el mismo sin importar cuántos workers ni en qué orden se generen.
+    """
+    semilla = np.random.SeedSequence(seed, spawn_key=(fechas[0].year, fechas[0].month))
+    return _generar_filas(fechas, np.random.default_rng(semilla), *catalogo, tasa_actividad=tasa_actividad)
+
+def _generar_particiones(particiones, seed, catalogo, tasa_actividad=0.4, workers=1):
+    """Genera las particiones (en paralelo con `workers` > 1) y las devuelve en orden de fechas."""
+    if workers > 1 and len(particiones) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_generar_particion, particiones, repeat(seed), repeat(catalogo),
+                                 repeat(tasa_actividad)))
+    return [_generar_particion(fechas, seed, catalogo, tasa_actividad) for fechas in particiones]
+
+def generar_base_datos(seed=42, fecha_inicio=FECHA_INICIO, fecha_fin=FECHA_FIN, n_clientes=300, n_tiendas=8,
+                       tasa_actividad=0.4, workers=1):
+    print("Generando datos simulados (ETL)... Por favor espere.")
+    if not 0 < tasa_actividad <= 1 or int(n_clientes * tasa_actividad) < 1:
+        raise ValueError(f"tasa_actividad={tasa_actividad} con {n_clientes} clientes no deja clientes activos")
+    rng = np.random.default_rng(seed)
+
+    # --- 1. CONFIGURACIÓN INICIAL ---
+    catalogo = _catalogo(rng, n_customers=n_clientes, n_stores=n_tiendas)
+
+    # --- 2. GENERACIÓN VECTORIZADA (Diaria), particionada por mes ---
+    # Para cumplir 1.3.1 (combinación única), cada día selecciona un subset de clientes sin reemplazo.
+    # Las particiones se concatenan en orden de fechas antes de ordenar para los acumulados.
+    particiones = _rangos_de_fechas(fecha_inicio, fecha_fin, 'M')
+    df = pd.concat(_generar_particiones(particiones, seed, catalogo, tasa_actividad, workers), ignore_index=True)
 
     # --- 3. CÁLCULOS ACUMULADOS (YTD) ---
-    # Ordenamos por Cliente y Fecha
-    df = df.sort_values(by=['CustomerKey', 'Date'])
-    
-    # Agrupamos por Año y Cliente para calcular acumulados reiniciando cada año
-    df['Profit Acumulado'] = df.groupby(['Year', 'CustomerKey'])['Profit'].cumsum()
-    df['Budget Profit Acumulado'] = df.groupby(['Year', 'CustomerKey'])['Budget Profit'].cumsum()
+    df, _ = _acumular_ytd(df)
 
     print("Datos diarios generados. Procediendo al Clustering...")
     return df
 
-def generar_datos_clustering(df_diario):
+def construir_dimensiones(df_diario):
     """
-    Genera la tabla resumida con segmentos (Burbujas).
-    El clustering se hace a nivel de CLIENTE (único segmento por cliente)
-    basado en su comportamiento agregado.
+    Tablas de dimensión de cliente y tienda, indexadas por la clave sustituta entera
+    (el código de la categoría en la tabla de hechos).
     """
-    
-    # Agrupar datos por Cliente para obtener métricas globales
-    df_customer_total = df_diario.groupby(['CustomerKey']).agg({
-        'Profit': 'sum',
-        'Budget Profit': 'sum',
-        'Income': 'sum',
-        'Name': 'first'
-    }).reset_index()
+    dim_clientes = pd.DataFrame({
+        'CustomerKey': df_diario['CustomerKey'].cat.categories,
+        'Name': df_diario['Name'].cat.categories,
+    })
+    descripciones = df_diario['Store Description'].cat.categories
+    dim_tiendas = pd.DataFrame({
+        'StoreKey': df_diario['StoreKey'].cat.categories,
+        'Store Description': descripciones,
+        'Zona': descripciones.str.split(' - Zona ').str[-1],
+    })
+    return dim_clientes, dim_tiendas
+
+# Número de segmentos de clientes (burbujas)
+N_SEGMENTOS = 4
+
+def segmentar_clientes(X, n_segmentos=N_SEGMENTOS, metodo='minibatch', modelo=None, random_state=42):
+    """
+    Asigna un segmento a cada fila de X (arreglo n x 2: Profit, % Cumplimiento).
+
+    - 'minibatch': estandariza las variables (Profit ya no domina la distancia) y ajusta
+      MiniBatchKMeans; escala a millones de clientes. Si `modelo` trae un ajuste previo,
+      arranca desde sus centroides (llevados a la estandarización actual; warm start, una sola corrida).
+    - 'kmeans': el KMeans completo original (n_init=10, sin escalar), como referencia.
+
+    Devuelve (rango, modelo): rango 0..k-1 ordenado por Profit medio del segmento (0 = peor)
+    y el modelo {'media', 'escala', 'centroides'} con los centroides ya en orden de rango,
+    de modo que el segmento i de la próxima corrida arranca desde el segmento i de esta.
+    """
+    X = np.asarray(X, dtype=float)
+    if metodo == 'kmeans':
+        etiquetas = KMeans(n_clusters=n_segmentos, random_state=random_state, n_init=10).fit_predict(X)
+        media, escala, centroides = np.zeros(X.shape[1]), np.ones(X.shape[1]), None
+    else:
+        media, escala = X.mean(axis=0), X.std(axis=0)
+        escala[escala == 0] = 1
+        if modelo and modelo.get('centroides'):
+            # Los centroides guardados están en las unidades estandarizadas de la corrida
+            # anterior: se pasan a unidades originales y se estandarizan con las de ahora
+            centroides_previos = np.asarray(modelo['centroides']) * modelo['escala'] + modelo['media']
+            init, n_init = (centroides_previos - media) / escala, 1
+        else:
+            init, n_init = 'k-means++', 3
+        kmeans = MiniBatchKMeans(n_clusters=n_segmentos, init=init, n_init=n_init,
+                                 batch_size=4096, random_state=random_state)
+        etiquetas = kmeans.fit_predict((X - media) / escala)
+        centroides = kmeans.cluster_centers_
+
+    # Renombrar Clusters basado en Profit medio (0 = Peor, k-1 = Mejor)
+    conteo = np.bincount(etiquetas, minlength=n_segmentos)
+    profit_medio = np.bincount(etiquetas, weights=X[:, 0], minlength=n_segmentos) / np.maximum(conteo, 1)
+    profit_medio[conteo == 0] = np.inf
+    orden = np.argsort(profit_medio, kind='stable')
+    rango = np.empty(n_segmentos, dtype=np.int64)
+    rango[orden] = np.arange(n_segmentos)
+
+    nuevo_modelo = {
+        'media': media.tolist(),
+        'escala': escala.tolist(),
+        'centroides': centroides[orden].tolist() if centroides is not None else None,
+    }
+    return rango[etiquetas], nuevo_modelo
+
+def _parciales_mensuales(df_diario, n_clientes):
+    """
+    Sumas y conteos por (Year, Month, CustomerID) en una sola pasada sobre `df_diario`,
+    agrupando por una sola clave entera compuesta en lugar de tres columnas. Los parciales
+    de distintos bloques de datos se combinan sumando (ver `_combinar_parciales`).
+    """
+    year_base = int(df_diario['Year'].min())
+    periodo = (df_diario['Year'].to_numpy() - year_base) * 12 + df_diario['Month'].to_numpy() - 1
+    clave = periodo * n_clientes + df_diario['CustomerKey'].cat.codes.to_numpy()
+    grupos = df_diario[['Profit', 'Budget Profit', 'Income', '% Cumplimiento']].groupby(clave)
+    parciales = grupos.sum().rename(columns={'% Cumplimiento': 'Suma Cumplimiento'})
+    parciales['Registros'] = grupos.size()
+    clave = parciales.index.to_numpy()
+    parciales = parciales.reset_index(drop=True)
+    parciales['Year'] = clave // n_clientes // 12 + year_base
+    parciales['Month'] = clave // n_clientes % 12 + 1
+    parciales['CustomerID'] = clave % n_clientes
+    return parciales
+
+def _combinar_parciales(lista_parciales):
+    return pd.concat(lista_parciales).groupby(['Year', 'Month', 'CustomerID'], as_index=False).sum()
+
+def _segmentar_mensual(parciales, dim_clientes, metodo='minibatch', modelo=None):
+    """Tabla mensual segmentada a partir de los parciales mensuales (ver `generar_datos_clustering`)."""
+    df_monthly = parciales[['Year', 'Month', 'CustomerID', 'Profit', 'Budget Profit', 'Income']].copy()
+    # Usar el promedio del cumplimiento ya calculado aleatoriamente (no se recalcula)
+    df_monthly['% Cumplimiento'] = parciales['Suma Cumplimiento'].to_numpy() / parciales['Registros'].to_numpy()
+
+    # --- 2. TOTALES POR CLIENTE: derivados de la tabla mensual (mucho más pequeña) ---
+    df_customer_total = df_monthly.groupby('CustomerID')[['Profit', 'Budget Profit', 'Income']].sum()
 
     # Calcular Cumplimiento Global del Cliente
     df_customer_total['% Cumplimiento'] = np.maximum(
@@ -138,42 +312,983 @@ def generar_datos_clustering(df_diario):
         ), 0
     )
 
-    # --- CLUSTERING GLOBAL (Un segmento por cliente) ---
-    X = df_customer_total[['Profit', '% Cumplimiento']]
-    
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-    df_customer_total['Cluster_Label'] = kmeans.fit_predict(X)
+    # --- 3. CLUSTERING GLOBAL (Un segmento por cliente) ---
+    X = df_customer_total[['Profit', '% Cumplimiento']].to_numpy()
+    rango, nuevo_modelo = segmentar_clientes(X, n_segmentos=N_SEGMENTOS, metodo=metodo, modelo=modelo)
+    if modelo is not None:
+        modelo.update(nuevo_modelo)
     
-    # Renombrar Clusters basado en Profit (0 = Peor, 3 = Mejor)
-    cluster_centers = df_customer_total.groupby('Cluster_Label')['Profit'].mean().sort_values()
-    cluster_map = {
-        old_label: f"Segmento {new_rank+1}" 
-        for new_rank, old_label in enumerate(cluster_centers.index)
-    }
-    df_customer_total['Segmento'] = df_customer_total['Cluster_Label'].map(cluster_map)
+    # Mapeo indexado CustomerID -> rango de segmento (en lugar de un merge)
+    segmento_por_cliente = np.full(len(dim_clientes), -1, dtype=np.int8)
+    segmento_por_cliente[df_customer_total.index.to_numpy()] = rango
+    codigos = df_monthly.pop('CustomerID').to_numpy()
+
+    # Asignar el segmento único a cada cliente (Segmento 1 = Peor, Segmento 4 = Mejor) y unir
+    # las descripciones solo para presentación (categorías con el mismo código del cliente)
+    df_segmented = df_monthly
+    df_segmented['CustomerKey'] = pd.Categorical.from_codes(codigos, dim_clientes['CustomerKey'])
+    df_segmented['Name'] = pd.Categorical.from_codes(codigos, dim_clientes['Name'])
+    df_segmented['Segmento'] = pd.Categorical.from_codes(
+        segmento_por_cliente[codigos], [f"Segmento {r+1}" for r in range(N_SEGMENTOS)]
+    )
+    return df_segmented[['Year', 'Month', 'CustomerKey', 'Profit', 'Budget Profit', 'Income',
+                         'Name', '% Cumplimiento', 'Segmento']]
+
+def generar_datos_clustering(df_diario, metodo='minibatch', modelo=None):
+    """
+    Genera la tabla resumida con segmentos (Burbujas).
+    El clustering se hace a nivel de CLIENTE (único segmento por cliente)
+    basado en su comportamiento agregado. Si se pasa `modelo` (dict), se usa como
+    punto de partida y se actualiza en sitio con el nuevo ajuste (ver `segmentar_clientes`).
+    """
+    # Las agregaciones trabajan sobre la clave sustituta entera; los nombres se unen al final
+    dim_clientes, _ = construir_dimensiones(df_diario)
     
-    # Crear mapeo de CustomerKey -> Segmento
-    customer_segment_map = df_customer_total[['CustomerKey', 'Segmento']].copy()
+    # --- 1. UNA SOLA PASADA SOBRE df_diario: grano mensual (Year, Month, Cliente) ---
+    parciales = _parciales_mensuales(df_diario, len(dim_clientes))
+    df_segmented = _segmentar_mensual(parciales, dim_clientes, metodo=metodo, modelo=modelo)
     
-    # Agrupar datos mensuales para el dashboard
-    df_monthly = df_diario.groupby(['Year', 'Month', 'CustomerKey']).agg({
+    print("Clustering completado. Cada cliente tiene un único segmento asignado.")
+    return df_segmented
+
+def _agregar_segmentos(clientes):
+    """Burbujas por segmento a partir de la agregación por cliente del período."""
+    return clientes.groupby('Segmento', observed=True).agg({
+        'Profit': 'sum',
+        '% Cumplimiento': 'mean',
+        'CustomerKey': 'count'
+    }).rename(columns={
+        'Profit': 'Total Profit (X)',
+        '% Cumplimiento': 'Avg Cumplimiento (Y)',
+        'CustomerKey': 'Num Clientes (Size)'
+    }).reset_index()
+
+# Columnas ordenables de la tabla de clientes
+COLUMNAS_TABLA = ['Name', 'Segmento', 'Profit']
+
+def _ordenes_tabla(clientes):
+    """Permutaciones (ascendentes, estables) de las filas del período por cada columna de la tabla."""
+    ordenes = {}
+    for col in COLUMNAS_TABLA:
+        valores = clientes[col]
+        if isinstance(valores.dtype, pd.CategoricalDtype):
+            valores = valores.astype(str)
+        ordenes[col] = np.argsort(valores.to_numpy(), kind='stable')
+    return ordenes
+
+def construir_indice_periodos(df_mensual_segmentado):
+    """
+    Tabla mensual ordenada por (Year, Month) y el rango de filas [inicio, fin) de cada período:
+    (Year, Month) y (Year, 0) = todo el año. Con `cortar_periodo` cada período es una vista
+    (iloc sobre un rango contiguo) en lugar de una copia filtrada con una máscara booleana.
+    """
+    tabla = df_mensual_segmentado
+    clave = tabla['Year'].to_numpy(dtype=np.int64) * 12 + tabla['Month'].to_numpy(dtype=np.int64) - 1
+    if np.any(clave[1:] < clave[:-1]):
+        # Solo se reordena si hace falta (p. ej. después de anexar días con `agregar_dias`)
+        orden = np.argsort(clave, kind='stable')
+        tabla = tabla.take(orden).reset_index(drop=True)
+        clave = clave[orden]
+    cortes = np.flatnonzero(clave[1:] != clave[:-1]) + 1
+    rangos = {}
+    for inicio, fin in zip(np.concatenate([[0], cortes]), np.concatenate([cortes, [len(clave)]])):
+        year, month = divmod(int(clave[inicio]), 12)
+        rangos[(year, month + 1)] = (int(inicio), int(fin))
+        # Los meses de un año son contiguos: el año va del primer mes al último
+        rangos[(year, 0)] = (rangos.get((year, 0), (int(inicio),))[0], int(fin))
+    return {'tabla': tabla, 'rangos': rangos}
+
+def cortar_periodo(indice_periodos, year, month):
+    """Filas del período (Month 0 = todo el año) como vista de la tabla ordenada, o None."""
+    rango = indice_periodos['rangos'].get((year, month))
+    if rango is None:
+        return None
+    return indice_periodos['tabla'].iloc[rango[0]:rango[1]]
+
+def construir_cubo_segmentos(df_mensual_segmentado, indice_periodos=None):
+    """
+    Pre-agrega el cubo de la gráfica de burbujas para cada (Year, Month) y para cada
+    (Year, 0) = "Todos los meses". Cada entrada guarda la agregación por cliente
+    ('clientes'), por segmento ('segmentos'), el número de registros del período y
+    los órdenes precalculados de la tabla de clientes ('ordenes'). Los mismos 'clientes'
+    sirven a la gráfica de burbujas, al drill-down y a la tabla.
+    """
+    if indice_periodos is None:
+        indice_periodos = construir_indice_periodos(df_mensual_segmentado)
+    cubo = {}
+
+    # Meses individuales: la tabla mensual ya tiene grano (Year, Month, Cliente), así que
+    # 'clientes' es directamente la vista del período (sin copias)
+    for (year, month), (inicio, fin) in indice_periodos['rangos'].items():
+        if month == 0:
+            continue
+        clientes = cortar_periodo(indice_periodos, year, month)
+        cubo[(year, month)] = {
+            'clientes': clientes,
+            'segmentos': _agregar_segmentos(clientes),
+            'registros': fin - inicio,
+            'ordenes': _ordenes_tabla(clientes),
+        }
+
+    # Año completo: se agrega primero a nivel cliente dentro del año (una sola vez para
+    # todos los años; el resultado queda ordenado por Year y cada año es otra vista)
+    columnas = ['CustomerKey', 'Name', 'Segmento', 'Profit', '% Cumplimiento', 'Income', 'Budget Profit']
+    anual = indice_periodos['tabla'].groupby(['Year', 'CustomerKey', 'Name', 'Segmento'], observed=True).agg({
         'Profit': 'sum',
-        'Budget Profit': 'sum',
+        '% Cumplimiento': 'mean',
         'Income': 'sum',
-        'Name': 'first',
-        '% Cumplimiento': 'mean'  # Usar el promedio del cumplimiento ya calculado aleatoriamente
+        'Budget Profit': 'sum'
     }).reset_index()
+    years_anual = anual['Year'].to_numpy()
+    for (year, month), (inicio, fin) in indice_periodos['rangos'].items():
+        if month != 0:
+            continue
+        desde, hasta = np.searchsorted(years_anual, [year, year + 1])
+        clientes = anual.iloc[desde:hasta][columnas]
+        cubo[(year, 0)] = {
+            'clientes': clientes,
+            'segmentos': _agregar_segmentos(clientes),
+            'registros': fin - inicio,
+            'ordenes': _ordenes_tabla(clientes),
+        }
+    return cubo
 
-    # No recalcular el cumplimiento, ya lo tenemos desde df_diario
-    
-    # Asignar el segmento único a cada cliente
-    df_segmented = df_monthly.merge(customer_segment_map, on='CustomerKey', how='left')
-    
-    print("Clustering completado. Cada cliente tiene un único segmento asignado.")
-    return df_segmented
+def construir_series_diarias(df_diario):
+    """
+    Profit diario total por año, precalculado una sola vez.
+    Devuelve {year: np.ndarray} indexado por día del año (posición 0 = 1 de enero),
+    con NaN en los días sin registros.
+    """
+    years = df_diario['Year'].to_numpy()
+    dia = df_diario['Date'].dt.dayofyear.to_numpy() - 1
+    series = {}
+    for year in np.unique(years):
+        en_year = years == year
+        n_dias = 366 if pd.Timestamp(year=int(year), month=12, day=31).dayofyear == 366 else 365
+        total = np.bincount(dia[en_year], weights=df_diario['Profit'].to_numpy()[en_year], minlength=n_dias)
+        con_datos = np.bincount(dia[en_year], minlength=n_dias) > 0
+        series[int(year)] = np.where(con_datos, total, np.nan)
+    return series
+
+def segmento_por_cliente(df_mensual_segmentado, n_clientes):
+    """Código de segmento de cada cliente (constante en la tabla mensual), indexado por su clave sustituta."""
+    segmento_cliente = np.zeros(n_clientes, dtype=np.int64)
+    segmento_cliente[df_mensual_segmentado['CustomerKey'].cat.codes.to_numpy()] = \
+        df_mensual_segmentado['Segmento'].cat.codes.to_numpy()
+    return segmento_cliente
+
+def construir_agregado_tiendas(df_diario, df_mensual_segmentado):
+    """
+    Agregado de la tabla diaria por (Year, Month, Tienda, Segmento del cliente), con la
+    descripción y la zona de cada tienda, ordenado por Year y Month. Se calcula una vez al
+    cargar: los filtros por tienda o zona recorren este agregado (tiendas x segmentos filas
+    por período), no df_diario. Promedio de % Cumplimiento = Suma Cumplimiento / Registros.
+    """
+    tiendas = df_diario['StoreKey'].cat.codes.to_numpy().astype(np.int64)
+    cliente = df_diario['CustomerKey'].cat.codes.to_numpy()
+    n_tiendas = len(df_diario['StoreKey'].cat.categories)
+    segmentos = df_mensual_segmentado['Segmento'].cat.categories
+    n_segmentos = len(segmentos)
+
+    segmento_cliente = segmento_por_cliente(df_mensual_segmentado, len(df_diario['CustomerKey'].cat.categories))
+
+    # Clave compuesta entera (período, tienda, segmento) y sumas con bincount en una pasada
+    year = df_diario['Year'].to_numpy(dtype=np.int64)
+    year_base = year.min()
+    periodo = (year - year_base) * 12 + df_diario['Month'].to_numpy(dtype=np.int64) - 1
+    clave = (periodo * n_tiendas + tiendas) * n_segmentos + segmento_cliente[cliente]
+    n_claves = int(clave.max()) + 1
+    registros = np.bincount(clave, minlength=n_claves)
+    presentes = np.flatnonzero(registros)
+    sumas = {
+        col: np.bincount(clave, weights=df_diario[col].to_numpy(), minlength=n_claves)[presentes]
+        for col in ['Profit', 'Budget Profit', 'Income', '% Cumplimiento']
+    }
+
+    resto, segmento = np.divmod(presentes, n_segmentos)
+    periodo, tienda = np.divmod(resto, n_tiendas)
+    _, dim_tiendas = construir_dimensiones(df_diario)
+    return pd.DataFrame({
+        'Year': year_base + periodo // 12,
+        'Month': periodo % 12 + 1,
+        'StoreKey': pd.Categorical.from_codes(tienda, categories=df_diario['StoreKey'].cat.categories),
+        'Store Description': pd.Categorical.from_codes(tienda, categories=df_diario['Store Description'].cat.categories),
+        'Zona': pd.Categorical(dim_tiendas['Zona'].to_numpy()[tienda], categories=ZONAS),
+        'Segmento': pd.Categorical.from_codes(segmento, categories=segmentos),
+        'Profit': sumas['Profit'],
+        'Budget Profit': sumas['Budget Profit'],
+        'Income': sumas['Income'],
+        'Suma Cumplimiento': sumas['% Cumplimiento'],
+        'Registros': registros[presentes],
+    })
+
+# --- MÉTRICAS MÓVILES Y DE PERÍODO CONTRA PERÍODO ---
+# Profit de los últimos 7/30/90 días y variación contra el mes anterior (MoM) y contra el
+# mismo período del año anterior (YoY), por cliente y por segmento. Se precalculan en grillas
+# densas (segmento x día, cliente x mes) con sumas acumuladas: una ventana es la diferencia
+# de dos acumulados. `actualizar_metricas_moviles` las extiende recorriendo solo los días nuevos.
+
+VENTANAS_MOVILES = (7, 30, 90)
+
+def _dias_desde(fechas, dia_inicio):
+    return (fechas.astype('datetime64[D]') - dia_inicio).astype(np.int64)
+
+def _mes_indice(year, month, year_inicio):
+    return (np.asarray(year, dtype=np.int64) - year_inicio) * 12 + np.asarray(month, dtype=np.int64) - 1
+
+def _limites_meses(metricas, meses):
+    """Primer y último día (índices desde el primer día cargado) de cada mes."""
+    inicio_mes = np.datetime64(f"{metricas['year_inicio']:04d}-01", 'M') + np.asarray(meses)
+    return (_dias_desde(inicio_mes.astype('datetime64[D]'), metricas['dia_inicio']),
+            _dias_desde((inicio_mes + 1).astype('datetime64[D]') - 1, metricas['dia_inicio']))
+
+def _cortes_mensuales(metricas, meses):
+    """Día (índice) al que se evalúan las ventanas de cada mes: su último día o el último cargado."""
+    return np.minimum(_limites_meses(metricas, meses)[1], metricas['n_dias'] - 1)
+
+def _meses_completos(metricas, meses):
+    """True para los meses con todos sus días cargados (ni cortados por la carga ni por el inicio)."""
+    primero, ultimo = _limites_meses(metricas, meses)
+    return (primero >= 0) & (ultimo <= metricas['n_dias'] - 1)
+
+def _ventanas_por_corte(codigo, dia, profit, n_clientes, cortes, orden=None):
+    """
+    Profit de cada cliente en las ventanas VENTANAS_MOVILES que terminan en cada día de
+    `cortes`: arreglo (ventanas x clientes x cortes). Sobre la serie diaria ordenada por
+    (cliente, día) es una diferencia de sumas acumuladas, ubicadas con searchsorted.
+    """
+    if orden is None:
+        orden = np.lexsort((dia, codigo))
+    cortes = np.asarray(cortes, dtype=np.int64)[None, :]
+    ancho = max(int(dia.max()) if len(dia) else 0, int(cortes.max())) + 2
+    clave = codigo[orden] * ancho + dia[orden]
+    acumulado = np.concatenate([[0.0], np.cumsum(profit[orden])])
+    base = np.arange(n_clientes, dtype=np.int64)[:, None] * ancho
+    hasta = np.searchsorted(clave, base + cortes, side='right')
+    ventanas = np.empty((len(VENTANAS_MOVILES), n_clientes, cortes.shape[1]))
+    for i, w in enumerate(VENTANAS_MOVILES):
+        # max(..., -1): la ventana no cruza al cliente anterior
+        desde = np.searchsorted(clave, base + np.maximum(cortes - w, -1), side='right')
+        ventanas[i] = acumulado[hasta] - acumulado[desde]
+    return ventanas
+
+def construir_metricas_moviles(df_diario, indice_clientes, segmento_cliente, segmentos, por_cliente=False):
+    """
+    Grillas de las métricas móviles y de período contra período. Se construye una vez al
+    cargar, sobre la serie diaria por cliente de `indice_clientes`; las consultas
+    (`metricas_segmentos`, `metricas_clientes`) solo leen las grillas. Las grillas por
+    cliente (cliente x mes, las más grandes) solo se arman con `por_cliente`, para quien
+    consulte `metricas_clientes`.
+    """
+    fechas = df_diario['Date'].to_numpy()
+    dia_inicio = fechas.min().astype('datetime64[D]')
+    year_inicio = int(df_diario['Year'].min())
+    dia = _dias_desde(fechas, dia_inicio)
+    mes = _mes_indice(df_diario['Year'].to_numpy(), df_diario['Month'].to_numpy(), year_inicio)
+    codigo = df_diario['CustomerKey'].cat.codes.to_numpy().astype(np.int64)
+    profit = df_diario['Profit'].to_numpy()
+    n_clientes = len(segmento_cliente)
+    n_segmentos = len(segmentos)
+    n_dias, n_meses = int(dia.max()) + 1, int(mes.max()) + 1
+
+    # Fila n_segmentos = todos los clientes
+    grupo = segmento_cliente[codigo]
+    diario_segmento = np.bincount(grupo * n_dias + dia, weights=profit,
+                                  minlength=n_segmentos * n_dias).reshape(n_segmentos, n_dias)
+    diario_segmento = np.vstack([diario_segmento, diario_segmento.sum(axis=0)])
+    mensual_segmento = np.bincount(grupo * n_meses + mes, weights=profit,
+                                   minlength=n_segmentos * n_meses).reshape(n_segmentos, n_meses)
+
+    metricas = {
+        'segmentos': list(segmentos),
+        'segmento_cliente': segmento_cliente,
+        'dia_inicio': dia_inicio,
+        'year_inicio': year_inicio,
+        'n_dias': n_dias,
+        'diario_segmento': diario_segmento,
+        # acumulado[:, d + 1] = profit desde el primer día hasta d inclusive
+        'acumulado_segmento': np.concatenate([np.zeros((n_segmentos + 1, 1)), np.cumsum(diario_segmento, axis=1)], axis=1),
+        'mensual_segmento': np.vstack([mensual_segmento, mensual_segmento.sum(axis=0)]),
+    }
+    if not por_cliente:
+        return metricas
+    metricas['mensual_cliente'] = np.bincount(codigo * n_meses + mes, weights=profit,
+                                              minlength=n_clientes * n_meses).reshape(n_clientes, n_meses)
+    orden = indice_clientes['orden']
+    if orden is None:
+        orden = np.arange(len(df_diario))
+    metricas['ventanas_cliente'] = _ventanas_por_corte(codigo, dia, profit, n_clientes,
+                                                       _cortes_mensuales(metricas, np.arange(n_meses)), orden)
+    # Filas de los últimos días: lo único que necesita la actualización para las ventanas
+    reciente = dia > n_dias - 1 - max(VENTANAS_MOVILES)
+    metricas['cola'] = {'codigo': codigo[reciente], 'dia': dia[reciente], 'profit': profit[reciente]}
+    return metricas
+
+def actualizar_metricas_moviles(metricas, df_nuevos):
+    """
+    Agrega a `metricas` (en sitio) los días de `df_nuevos`, posteriores a los ya cargados.
+    Recorre solo las filas nuevas y las de la cola de los últimos días; los meses anteriores
+    no se recalculan.
+    """
+    dia = _dias_desde(df_nuevos['Date'].to_numpy(), metricas['dia_inicio'])
+    if dia.min() < metricas['n_dias']:
+        raise ValueError("La actualización incremental solo admite fechas posteriores a la última cargada.")
+    mes = _mes_indice(df_nuevos['Year'].to_numpy(), df_nuevos['Month'].to_numpy(), metricas['year_inicio'])
+    codigo = df_nuevos['CustomerKey'].cat.codes.to_numpy().astype(np.int64)
+    profit = df_nuevos['Profit'].to_numpy()
+    n_grupos, dias_previos = metricas['diario_segmento'].shape
+    n_clientes, meses_previos = len(metricas['segmento_cliente']), metricas['mensual_segmento'].shape[1]
+    n_dias, n_meses = int(dia.max()) + 1, max(meses_previos, int(mes.max()) + 1)
+
+    # Grilla diaria por segmento: solo las columnas nuevas y su acumulado
+    nuevos = np.zeros((n_grupos, n_dias - dias_previos))
+    grupo = metricas['segmento_cliente'][codigo]
+    np.add.at(nuevos, (grupo, dia - dias_previos), profit)
+    nuevos[-1] = nuevos[:-1].sum(axis=0)
+    metricas['diario_segmento'] = np.hstack([metricas['diario_segmento'], nuevos])
+    metricas['acumulado_segmento'] = np.hstack([metricas['acumulado_segmento'],
+                                                metricas['acumulado_segmento'][:, -1:] + np.cumsum(nuevos, axis=1)])
+    metricas['n_dias'] = n_dias
+
+    for clave, filas in [('mensual_cliente', codigo), ('mensual_segmento', grupo)]:
+        if clave not in metricas:
+            continue
+        mensual = np.pad(metricas[clave], ((0, 0), (0, n_meses - meses_previos)))
+        np.add.at(mensual, (filas, mes), profit)
+        metricas[clave] = mensual
+    metricas['mensual_segmento'][-1] = metricas['mensual_segmento'][:-1].sum(axis=0)
+    if 'ventanas_cliente' not in metricas:
+        return
+
+    # Ventanas: solo los meses cuyo corte se movió, desde el mes del día siguiente al último cargado
+    siguiente = (metricas['dia_inicio'] + dias_previos).astype('datetime64[M]')
+    primer_mes = int((siguiente - np.datetime64(f"{metricas['year_inicio']:04d}-01", 'M')).astype(np.int64))
+    cola = metricas['cola']
+    codigo = np.concatenate([cola['codigo'], codigo])
+    dia = np.concatenate([cola['dia'], dia])
+    profit = np.concatenate([cola['profit'], profit])
+    meses = np.arange(primer_mes, n_meses)
+    ventanas = np.pad(metricas['ventanas_cliente'], ((0, 0), (0, 0), (0, n_meses - meses_previos)))
+    ventanas[:, :, primer_mes:] = _ventanas_por_corte(codigo, dia, profit, n_clientes, _cortes_mensuales(metricas, meses))
+    metricas['ventanas_cliente'] = ventanas
+    reciente = dia > n_dias - 1 - max(VENTANAS_MOVILES)
+    metricas['cola'] = {'codigo': codigo[reciente], 'dia': dia[reciente], 'profit': profit[reciente]}
+
+COLUMNAS_MOVILES = [f"Profit {w}d" for w in VENTANAS_MOVILES] + ['Profit', 'Profit MoM', 'Δ MoM %', 'Profit YoY', 'Δ YoY %']
+
+def _variacion(actual, anterior):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(anterior != 0, (actual - anterior) / np.abs(anterior) * 100, np.nan)
+
+def _metricas_periodo(metricas, year, month, mensual, ventanas):
+    """
+    Columnas COLUMNAS_MOVILES para las filas de `mensual` (filas x meses) en el período
+    (Month 0 = año). MoM y YoY solo comparan meses completos: si el período o el de
+    comparación está a medio cargar (p. ej. tras una ingesta incremental), quedan en NaN.
+    """
+    n_meses = mensual.shape[1]
+    n = mensual.shape[0]
+
+    def suma_meses(meses):
+        meses = np.asarray(meses)
+        if not _meses_completos(metricas, meses).all():
+            return np.full(n, np.nan)
+        return mensual[:, meses].sum(axis=1)
+
+    if month == 0:
+        meses = _mes_indice(year, np.arange(1, 13), metricas['year_inicio'])
+        anterior_mes = np.full(n, np.nan)
+    else:
+        meses = _mes_indice(year, [month], metricas['year_inicio'])
+        anterior_mes = suma_meses(meses - 1)
+    cargados = meses[(meses >= 0) & (meses < n_meses)]
+    if len(cargados) == 0:
+        return None
+    actual = mensual[:, cargados].sum(axis=1)
+    anterior_year = suma_meses(meses - 12)
+    if not _meses_completos(metricas, meses).all():
+        # Período a medio cargar: no se compara contra meses completos
+        anterior_mes = anterior_year = np.full(n, np.nan)
+    corte = ventanas(int(cargados[-1]))
+    return pd.DataFrame({
+        **{f"Profit {w}d": corte[i] for i, w in enumerate(VENTANAS_MOVILES)},
+        'Profit': actual,
+        'Profit MoM': anterior_mes,
+        'Δ MoM %': _variacion(actual, anterior_mes),
+        'Profit YoY': anterior_year,
+        'Δ YoY %': _variacion(actual, anterior_year),
+    }, columns=COLUMNAS_MOVILES)
+
+def periodo_parcial(metricas, year, month):
+    """True si al período (Month 0 = año) le faltan días por cargar: MoM/YoY quedan en NaN."""
+    meses = _mes_indice(year, np.arange(1, 13) if month == 0 else [month], metricas['year_inicio'])
+    return not _meses_completos(metricas, meses).all()
+
+def metricas_clientes(metricas, year, month):
+    """
+    Métricas móviles y MoM/YoY de cada cliente (fila = clave sustituta) en el período, o None.
+    Requiere las grillas por cliente (`construir_metricas_moviles(..., por_cliente=True)`).
+    """
+    if 'ventanas_cliente' not in metricas:
+        raise ValueError("Métricas construidas sin por_cliente=True: no hay grillas por cliente.")
+    return _metricas_periodo(metricas, year, month, metricas['mensual_cliente'],
+                             lambda mes: metricas['ventanas_cliente'][:, :, mes])
+
+def metricas_segmentos(metricas, year, month):
+    """Las mismas métricas por segmento (más 'Todos'), indexadas por nombre del segmento, o None."""
+    def ventanas(mes):
+        corte = _cortes_mensuales(metricas, [mes])[0]
+        acumulado = metricas['acumulado_segmento']
+        return np.array([acumulado[:, corte + 1] - acumulado[:, max(corte + 1 - w, 0)] for w in VENTANAS_MOVILES])
+
+    tabla = _metricas_periodo(metricas, year, month, metricas['mensual_segmento'], ventanas)
+    if tabla is not None:
+        tabla.index = pd.Index(metricas['segmentos'] + ['Todos'], name='Segmento')
+    return tabla
+
+# Columnas del historial diario de un cliente (drill-through por cliente)
+COLUMNAS_HISTORIAL = ['Date', 'Profit', 'Profit Acumulado', 'Budget Profit Acumulado']
+
+def construir_indice_clientes(df_diario):
+    """
+    Índice por cliente sobre la tabla diaria: las filas del cliente con clave sustituta `c`
+    son las posiciones offsets[c]:offsets[c + 1], en orden de fecha. `_acumular_ytd` ya deja
+    df_diario ordenado por (Cliente, Fecha); entonces 'orden' es None y cada cliente es un
+    rango contiguo. Si no (p. ej. tras `agregar_dias`), 'orden' es la permutación que lo ordena.
+    """
+    codigos = df_diario['CustomerKey'].cat.codes.to_numpy()
+    fechas = df_diario['Date'].to_numpy()
+    n_clientes = len(df_diario['CustomerKey'].cat.categories)
+    mismo_cliente = codigos[1:] == codigos[:-1]
+    ordenado = np.all(codigos[1:] >= codigos[:-1]) and np.all(fechas[1:][mismo_cliente] >= fechas[:-1][mismo_cliente])
+    orden = None
+    if not ordenado:
+        orden = np.lexsort((fechas, codigos))
+        codigos = codigos[orden]
+    offsets = np.zeros(n_clientes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codigos, minlength=n_clientes), out=offsets[1:])
+    return {'orden': orden, 'offsets': offsets}
+
+def historial_cliente(df_diario, indice_clientes, cliente, columnas=COLUMNAS_HISTORIAL):
+    """Filas diarias del cliente `cliente` (clave sustituta) en orden de fecha: O(filas del cliente)."""
+    offsets = indice_clientes['offsets']
+    if not 0 <= cliente < len(offsets) - 1:
+        return df_diario.iloc[0:0][columnas]
+    inicio, fin = offsets[cliente], offsets[cliente + 1]
+    if indice_clientes['orden'] is None:
+        filas = df_diario.iloc[inicio:fin]
+    else:
+        filas = df_diario.take(indice_clientes['orden'][inicio:fin])
+    return filas[columnas]
+
+def _limites_periodo(year, month):
+    """[desde, hasta) del período como datetime64[ns]; Month 0 = todo el año."""
+    if month == 0:
+        return np.datetime64(f"{year:04d}-01-01", 'ns'), np.datetime64(f"{year + 1:04d}-01-01", 'ns')
+    desde = np.datetime64(f"{year:04d}-{month:02d}", 'M')
+    return desde.astype('datetime64[ns]'), (desde + 1).astype('datetime64[ns]')
+
+def posiciones_periodo_diario(df_diario, indice_clientes, year, month, clientes=None, filas_por_bloque=100_000):
+    """
+    Generador de bloques de posiciones (filas de df_diario) del período, cliente por cliente
+    y en orden de fecha, de a lo sumo ~`filas_por_bloque` filas. Con el índice de offsets cada
+    cliente es un rango ordenado por fecha: el período se ubica con searchsorted, sin armar
+    una máscara sobre toda la tabla. `clientes`: códigos a incluir (None = todos).
+    """
+    desde, hasta = _limites_periodo(year, month)
+    fechas = df_diario['Date'].to_numpy()
+    offsets, orden = indice_clientes['offsets'], indice_clientes['orden']
+    if clientes is None:
+        clientes = range(len(offsets) - 1)
+    bloque, n_bloque = [], 0
+    for cliente in clientes:
+        inicio, fin = offsets[cliente], offsets[cliente + 1]
+        posiciones = np.arange(inicio, fin) if orden is None else orden[inicio:fin]
+        fechas_cliente = fechas[inicio:fin] if orden is None else fechas[posiciones]
+        a, b = np.searchsorted(fechas_cliente, [desde, hasta])
+        if b > a:
+            bloque.append(posiciones[a:b])
+            n_bloque += b - a
+        if n_bloque >= filas_por_bloque:
+            yield np.concatenate(bloque)
+            bloque, n_bloque = [], 0
+    if bloque:
+        yield np.concatenate(bloque)
+
+def serie_profit(series_diarias, year, frecuencia='D'):
+    """
+    Serie de Profit de un año como pd.Series indexada por fecha; `frecuencia` 'D', 'W' o 'MS'
+    re-muestrea (suma) el arreglo diario precalculado sin volver a tocar df_diario.
+    """
+    valores = series_diarias[year]
+    fechas = pd.date_range(start=datetime.date(year, 1, 1), periods=len(valores), freq='D')
+    serie = pd.Series(valores, index=fechas, name='Profit')
+    if frecuencia != 'D':
+        serie = serie.resample(frecuencia).sum(min_count=1)
+    return serie
+
+def lttb_indices(x, y, n_puntos):
+    """
+    Índices de los `n_puntos` que conserva Largest-Triangle-Three-Buckets: siempre el primero
+    y el último, y en cada bucket intermedio el punto que forma el triángulo de mayor área con
+    el punto elegido del bucket anterior y el promedio del bucket siguiente.
+    """
+    n = len(x)
+    if n_puntos >= n or n_puntos < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # n_puntos - 2 buckets sobre los puntos 1 .. n-2
+    cortes = np.linspace(1, n - 1, n_puntos - 1).astype(np.int64)
+    indices = np.empty(n_puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_puntos - 2):
+        inicio, fin = cortes[i], cortes[i + 1]
+        if i + 2 < len(cortes):
+            x_sig, y_sig = x[fin:cortes[i + 2]].mean(), y[fin:cortes[i + 2]].mean()
+        else:
+            x_sig, y_sig = x[-1], y[-1]
+        areas = np.abs((x[a] - x_sig) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin]) * (y_sig - y[a]))
+        a = inicio + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+def reducir_serie(serie, n_puntos, desde=None, hasta=None):
+    """
+    Recorta `serie` (indexada por fecha) a [desde, hasta], con un punto extra a cada lado para
+    que la línea llegue a los bordes, y la reduce con LTTB a lo sumo a `n_puntos`.
+    """
+    if desde is not None or hasta is not None:
+        fechas = serie.index
+        i = fechas.searchsorted(pd.Timestamp(desde)) if desde is not None else 0
+        j = fechas.searchsorted(pd.Timestamp(hasta), side='right') if hasta is not None else len(fechas)
+        serie = serie.iloc[max(i - 1, 0):j + 1]
+    if len(serie) <= n_puntos:
+        return serie
+    serie = serie.dropna()
+    return serie.iloc[lttb_indices(serie.index.asi8, serie.to_numpy(), n_puntos)]
+
+def construir_indice_nombres(nombres):
+    """
+    Nombres de cliente en minúsculas para la búsqueda de la tabla, en una pasada vectorizada.
+    `nombres` está indexado por la clave sustituta del cliente (posición = id).
+    """
+    return pd.Series(np.asarray(nombres, dtype=object)).str.lower()
+
+def buscar_nombres(nombres, texto):
+    """
+    Ids de los clientes cuyo nombre contiene `texto` (sin distinguir mayúsculas). Recorre
+    todos los nombres con `str.contains` vectorizado: con nombres cortos es tan rápido como
+    un índice de n-gramas, sin su costo de construcción en cada carga.
+    """
+    return np.flatnonzero(nombres.str.contains(texto.lower(), regex=False).to_numpy(dtype=bool))
+
+# --- INGESTA INCREMENTAL (solo anexar días nuevos) ---
+# En lugar de regenerar toda la historia, se anexan días nuevos arrastrando un estado pequeño:
+# el acumulado YTD por (Year, Cliente) y el número de registros por (Year, Month, Cliente).
+# El ordenamiento, los cumsum y las agregaciones solo recorren las filas nuevas.
+
+def generar_dias(df_diario, fecha_inicio, fecha_fin, seed=None, tasa_actividad=0.4):
+    """
+    Filas diarias nuevas (sin columnas acumuladas) para [fecha_inicio, fecha_fin], con el mismo
+    catálogo de clientes y tiendas de `df_diario`. Sin `seed` se usa la fecha de inicio.
+    """
+    if seed is None:
+        seed = int(pd.Timestamp(fecha_inicio).strftime('%Y%m%d'))
+    rng = np.random.default_rng(seed)
+    date_range = pd.date_range(start=fecha_inicio, end=fecha_fin, freq='D')
+    return _generar_filas(
+        date_range, rng,
+        df_diario['CustomerKey'].cat.categories, df_diario['Name'].cat.categories,
+        df_diario['StoreKey'].cat.categories, df_diario['Store Description'].cat.categories,
+        tasa_actividad=tasa_actividad,
+    )
+
+def construir_estado_incremental(df_diario, df_mensual_segmentado):
+    """
+    Estado que se arrastra entre cargas incrementales. Se construye una sola vez (recorre la
+    historia); después `agregar_dias` lo mantiene al día recorriendo solo las filas nuevas.
+    """
+    cliente = df_diario['CustomerKey'].cat.codes
+    mensual_cliente = df_mensual_segmentado['CustomerKey'].cat.codes
+    return {
+        # Último acumulado YTD por (Year, Cliente) = suma del año hasta la fecha
+        'acumulados': df_diario.groupby([df_diario['Year'].to_numpy(), cliente])[['Profit', 'Budget Profit']].sum(),
+        # Registros por (Year, Month, Cliente): necesarios para actualizar el promedio de % Cumplimiento
+        'registros_mes': df_diario.groupby([df_diario['Year'], df_diario['Month'], cliente]).size(),
+        # Posición de cada (Year, Month, Cliente) en df_mensual_segmentado
+        'posicion_mes': pd.Series(
+            np.arange(len(df_mensual_segmentado)),
+            index=pd.MultiIndex.from_arrays([df_mensual_segmentado['Year'], df_mensual_segmentado['Month'], mensual_cliente]),
+        ),
+        'segmento': pd.Series(df_mensual_segmentado['Segmento'].to_numpy(), index=mensual_cliente.to_numpy()).groupby(level=0).first(),
+        'ultima_fecha': df_diario['Date'].max(),
+    }
+
+def agregar_dias(df_diario, df_mensual_segmentado, df_nuevos, estado):
+    """
+    Anexa `df_nuevos` (salida de `generar_dias`) a la tabla de hechos y actualiza solo los
+    agregados mensuales afectados. Devuelve (df_diario, df_mensual_segmentado); `estado` se
+    actualiza en sitio. Las fechas nuevas deben ser posteriores a las existentes.
+    """
+    if df_nuevos['Date'].min() <= estado['ultima_fecha']:
+        raise ValueError("La ingesta incremental solo admite fechas posteriores a la última cargada.")
+
+    # --- 1. ACUMULADOS YTD: cumsum de las filas nuevas + último acumulado arrastrado ---
+    nuevos, estado['acumulados'] = _acumular_ytd(df_nuevos, estado['acumulados'])
+    cliente = nuevos['CustomerKey'].cat.codes.to_numpy()
+    estado['ultima_fecha'] = nuevos['Date'].max()
+
+    inicio = df_diario.index.max() + 1 if len(df_diario) else 0
+    nuevos.index = pd.RangeIndex(inicio, inicio + len(nuevos))
+    df_diario = pd.concat([df_diario, nuevos])
+
+    # --- 2. AGREGADOS MENSUALES: solo los (Year, Month, Cliente) tocados por las filas nuevas ---
+    delta = nuevos.groupby([nuevos['Year'], nuevos['Month'], cliente]).agg(
+        Profit=('Profit', 'sum'),
+        BudgetProfit=('Budget Profit', 'sum'),
+        Income=('Income', 'sum'),
+        SumaCumplimiento=('% Cumplimiento', 'sum'),
+        Registros=('% Cumplimiento', 'size'),
+    )
+    registros_previos = estado['registros_mes'].reindex(delta.index, fill_value=0).to_numpy()
+    posiciones = estado['posicion_mes'].reindex(delta.index)
+    existentes = posiciones.notna().to_numpy()
+
+    df_mensual_segmentado = df_mensual_segmentado.copy()
+    if existentes.any():
+        pos = posiciones[existentes].astype(np.int64).to_numpy()
+        d = delta[existentes]
+        n_previo = registros_previos[existentes]
+        for col, col_delta in [('Profit', 'Profit'), ('Budget Profit', 'BudgetProfit'), ('Income', 'Income')]:
+            idx = df_mensual_segmentado.columns.get_loc(col)
+            df_mensual_segmentado.iloc[pos, idx] = df_mensual_segmentado[col].to_numpy()[pos] + d[col_delta].to_numpy()
+        idx = df_mensual_segmentado.columns.get_loc('% Cumplimiento')
+        promedio = df_mensual_segmentado['% Cumplimiento'].to_numpy()[pos]
+        df_mensual_segmentado.iloc[pos, idx] = (promedio * n_previo + d['SumaCumplimiento'].to_numpy()) / (n_previo + d['Registros'].to_numpy())
+
+    if (~existentes).any():
+        d = delta[~existentes]
+        codigos = d.index.get_level_values(2).to_numpy()
+        categorias = df_mensual_segmentado['CustomerKey'].cat.categories
+        filas = pd.DataFrame({
+            'Year': d.index.get_level_values(0).to_numpy(),
+            'Month': d.index.get_level_values(1).to_numpy(),
+            'CustomerKey': pd.Categorical.from_codes(codigos, categorias),
+            'Profit': d['Profit'].to_numpy(),
+            'Budget Profit': d['BudgetProfit'].to_numpy(),
+            'Income': d['Income'].to_numpy(),
+            'Name': pd.Categorical.from_codes(codigos, df_mensual_segmentado['Name'].cat.categories),
+            '% Cumplimiento': d['SumaCumplimiento'].to_numpy() / d['Registros'].to_numpy(),
+            'Segmento': pd.Categorical(estado['segmento'].reindex(codigos).to_numpy(),
+                                       categories=df_mensual_segmentado['Segmento'].cat.categories),
+        }, index=pd.RangeIndex(len(df_mensual_segmentado), len(df_mensual_segmentado) + len(d)))
+        estado['posicion_mes'] = pd.concat([estado['posicion_mes'], pd.Series(filas.index.to_numpy(), index=d.index)])
+        df_mensual_segmentado = pd.concat([df_mensual_segmentado, filas])
+
+    estado['registros_mes'] = estado['registros_mes'].add(delta['Registros'], fill_value=0).astype(np.int64)
+    return df_diario, df_mensual_segmentado
+
+# --- SNAPSHOT COLUMNAR EN DISCO ---
+# Cada DataFrame se guarda como un .npy por columna (memory-mappable) más un manifest.json.
+# Las columnas de texto se guardan como códigos enteros + diccionario de categorías,
+# las fechas como int64 (ns). Así los workers hacen mmap en lugar de regenerar el ETL.
+
+def clave_snapshot(**parametros):
+    """Hash estable de los parámetros de generación; identifica un snapshot en disco."""
+    parametros = dict(parametros, version=VERSION_SNAPSHOT)
+    payload = json.dumps(parametros, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _guardar_frame(df, directorio, categorias_externas=False):
+    """Con `categorias_externas` los diccionarios no se repiten en el manifest (particiones)."""
+    os.makedirs(directorio)
+    columnas = []
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        meta = {'name': col, 'file': f"{i:03d}.npy"}
+        if isinstance(serie.dtype, pd.CategoricalDtype) or serie.dtype == object:
+            cat = serie.astype('category').cat
+            meta['kind'] = 'category'
+            if not categorias_externas:
+                meta['categories'] = cat.categories.tolist()
+            valores = cat.codes.to_numpy()
+        elif np.issubdtype(serie.dtype, np.datetime64):
+            meta['kind'] = 'datetime'
+            valores = serie.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        else:
+            meta['kind'] = 'numeric'
+            valores = serie.to_numpy()
+        np.save(os.path.join(directorio, meta['file']), valores)
+        columnas.append(meta)
+    np.save(os.path.join(directorio, 'index.npy'), df.index.to_numpy())
+    with open(os.path.join(directorio, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'columns': columnas, 'rows': len(df)}, f, ensure_ascii=False)
+
+def _cargar_frame(directorio, mmap=True, categorias=None):
+    modo = 'r' if mmap else None
+    with open(os.path.join(directorio, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    datos = {}
+    for meta in manifest['columns']:
+        valores = np.load(os.path.join(directorio, meta['file']), mmap_mode=modo)
+        if meta['kind'] == 'category':
+            dominio = meta['categories'] if 'categories' in meta else categorias[meta['name']]
+            datos[meta['name']] = pd.Categorical.from_codes(valores, dominio)
+        elif meta['kind'] == 'datetime':
+            datos[meta['name']] = valores.view('datetime64[ns]')
+        else:
+            datos[meta['name']] = valores
+    index = np.load(os.path.join(directorio, 'index.npy'), mmap_mode=modo)
+    # copy=False conserva los arreglos mapeados sin consolidarlos en memoria privada
+    return pd.DataFrame(datos, index=index, copy=False)
+
+def guardar_snapshot(df_diario, df_mensual_segmentado, clave, directorio=SNAPSHOT_DIR, modelo=None):
+    """
+    Escribe el snapshot de forma atómica (rename) para que varios procesos no lo vean a medias.
+    El modelo de segmentos que produjo las etiquetas va dentro del snapshot, publicado junto
+    con los datos. Devuelve (destino, publicado): publicado es False si ya existía un snapshot
+    con la misma clave, que se conserva tal cual.
+    """
+    destino = os.path.join(directorio, clave)
+    os.makedirs(directorio, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{clave}-", dir=directorio)
+    try:
+        _guardar_frame(df_diario, os.path.join(tmp, 'df_diario'))
+        _guardar_frame(df_mensual_segmentado, os.path.join(tmp, 'df_mensual_segmentado'))
+        if modelo:
+            _guardar_modelo_segmentos(modelo, tmp)
+        os.rename(tmp, destino)
+    except OSError:
+        # Otro proceso publicó el mismo snapshot primero (o el disco no es escribible)
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(destino):
+            raise
+        return destino, False
+    return destino, True
+
+def cargar_snapshot(clave, directorio=SNAPSHOT_DIR, mmap=True):
+    """Devuelve (df_diario, df_mensual_segmentado) desde disco, o None si no existe el snapshot."""
+    ruta = os.path.join(directorio, clave)
+    if not os.path.isdir(ruta):
+        return None
+    return (_cargar_frame(os.path.join(ruta, 'df_diario'), mmap=mmap),
+            _cargar_frame(os.path.join(ruta, 'df_mensual_segmentado'), mmap=mmap))
+
+def _cargar_modelo_segmentos(directorio):
+    """
+    Centroides y escala del último clustering publicado (warm start y etiquetas estables
+    entre refrescos). La copia de `directorio` solo se actualiza cuando se publica un snapshot.
+    """
+    try:
+        with open(os.path.join(directorio, 'modelo_segmentos.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _guardar_modelo_segmentos(modelo, directorio):
+    if not modelo.get('centroides'):
+        return
+    os.makedirs(directorio, exist_ok=True)
+    tmp = os.path.join(directorio, f".modelo_segmentos-{os.getpid()}.json")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(modelo, f)
+    os.replace(tmp, os.path.join(directorio, 'modelo_segmentos.json'))
+
+def _generar_y_segmentar(seed, directorio, workers=1, **escala):
+    modelo = _cargar_modelo_segmentos(directorio)
+    df_diario = compactar_para_compartir(generar_base_datos(seed=seed, workers=workers, **escala))
+    df_mensual_segmentado = compactar_para_compartir(generar_datos_clustering(df_diario, modelo=modelo))
+    return df_diario, df_mensual_segmentado, modelo
+
+def construir_snapshot(seed=42, directorio=SNAPSHOT_DIR, workers=1, **escala):
+    """
+    Ejecuta el ETL + clustering y publica el snapshot. Pensado para el pipeline de deploy.
+    La clave incluye los parámetros de `escala`; `workers` no entra en ella porque el
+    resultado no depende de cuántos procesos generen. Devuelve (destino, publicado); si ya
+    hay un snapshot con la misma clave no se regenera.
+    """
+    escala = dict(ESCALA_POR_DEFECTO, **escala)
+    clave = clave_snapshot(seed=seed, **escala)
+    if existe_snapshot(seed=seed, directorio=directorio, **escala):
+        return os.path.join(directorio, clave), False
+    df_diario, df_mensual_segmentado, modelo = _generar_y_segmentar(seed, directorio, workers, **escala)
+    destino, publicado = guardar_snapshot(df_diario, df_mensual_segmentado, clave, directorio, modelo)
+    if publicado:
+        _guardar_modelo_segmentos(modelo, directorio)
+    return destino, publicado
+
+def compactar_para_compartir(df):
+    """
+    Layout apto para copy-on-write entre workers de gunicorn: las columnas de texto pasan
+    a categorías (códigos enteros + diccionario), sin objetos Python por fila que el
+    conteo de referencias o el GC de cada worker terminen escribiendo.
+    """
+    texto = [col for col in df.columns if df[col].dtype == object]
+    return df.astype({col: 'category' for col in texto})
+
+def existe_snapshot(seed=42, directorio=SNAPSHOT_DIR, **escala):
+    """True si ya hay un snapshot publicado para los parámetros (la carga será un mmap)."""
+    clave = clave_snapshot(seed=seed, **dict(ESCALA_POR_DEFECTO, **escala))
+    return os.path.isdir(os.path.join(directorio, clave))
+
+def cargar_o_generar(seed=42, directorio=SNAPSHOT_DIR, **escala):
+    """
+    Carga los datos del snapshot que corresponde a los parámetros; si no existe,
+    los genera y lo intenta publicar para los siguientes workers/reinicios.
+    """
+    escala = dict(ESCALA_POR_DEFECTO, **escala)
+    clave = clave_snapshot(seed=seed, **escala)
+    datos = cargar_snapshot(clave, directorio)
+    if datos is not None:
+        print(f"Datos cargados desde snapshot {clave}.")
+        return datos
+    df_diario, df_mensual_segmentado, modelo = _generar_y_segmentar(seed, directorio, **escala)
+    try:
+        _, publicado = guardar_snapshot(df_diario, df_mensual_segmentado, clave, directorio, modelo)
+        if publicado:
+            _guardar_modelo_segmentos(modelo, directorio)
+    except OSError as e:
+        print(f"No se pudo guardar el snapshot ({e}). Se continúa con los datos en memoria.")
+    return df_diario, df_mensual_segmentado
+
+# --- PIPELINE STREAMING (por bloques de fechas) ---
+# Para volúmenes que no caben en memoria: la tabla de hechos se produce y se consume por
+# bloques de fechas; cada bloque se escribe como partición en disco (mismo formato columnar
+# del snapshot) y los agregados mensuales y acumulados YTD se arrastran entre bloques.
+
+def _rangos_de_fechas(fecha_inicio, fecha_fin, frecuencia='M'):
+    """Divide [fecha_inicio, fecha_fin] en rangos diarios contiguos por período ('M', 'Q', 'Y')."""
+    fechas = pd.date_range(start=fecha_inicio, end=fecha_fin, freq='D')
+    periodos = fechas.to_period(frecuencia).asi8
+    cortes = np.flatnonzero(periodos[1:] != periodos[:-1]) + 1
+    limites = np.concatenate([[0], cortes, [len(fechas)]])
+    return [fechas[a:b] for a, b in zip(limites[:-1], limites[1:])]
+
+def generar_bloques(seed=42, fecha_inicio=FECHA_INICIO, fecha_fin=FECHA_FIN, frecuencia='M',
+                    n_clientes=300, n_tiendas=8, tasa_actividad=0.4, workers=1):
+    """
+    Versión streaming de `generar_base_datos`: generador de DataFrames diarios, uno por
+    bloque de fechas (`frecuencia` 'M' = un mes), cada uno ordenado por Cliente y Fecha y ya
+    con sus acumulados YTD. Entre bloques solo se arrastra el acumulado por (Year, Cliente).
+    Usa las mismas particiones mensuales y semillas, así produce las mismas filas.
+    """
+    rng = np.random.default_rng(seed)
+    catalogo = _catalogo(rng, n_customers=n_clientes, n_stores=n_tiendas)
+    acumulados = None
+    for fechas in _rangos_de_fechas(fecha_inicio, fecha_fin, frecuencia):
+        particiones = _rangos_de_fechas(fechas[0], fechas[-1], 'M')
+        bloque = pd.concat(_generar_particiones(particiones, seed, catalogo, tasa_actividad, workers),
+                           ignore_index=True)
+        bloque, acumulados = _acumular_ytd(bloque, acumulados)
+        yield bloque
+
+def _es_directorio_de_particiones(directorio):
+    return all(nombre == 'categorias.json' or nombre.startswith('part-') for nombre in os.listdir(directorio))
+
+def escribir_particiones(bloques, directorio):
+    """
+    Escribe cada bloque como una partición columnar `part-NNNNN-YYYYMMDD` en `directorio` y lo
+    vuelve a emitir, para encadenar la escritura con el consumo. Los diccionarios de las
+    columnas categóricas se guardan una sola vez en `categorias.json`. Las particiones se
+    escriben en un directorio temporal que reemplaza a `directorio` solo al terminar: una
+    corrida anterior se reemplaza completa (sin particiones viejas mezcladas) y una corrida
+    interrumpida (o sin bloques) no deja nada publicado.
+    """
+    if os.path.isdir(directorio) and not _es_directorio_de_particiones(directorio):
+        raise ValueError(f"{directorio} tiene archivos que no son particiones; no se reemplaza.")
+    padre = os.path.dirname(os.path.abspath(directorio))
+    os.makedirs(padre, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{os.path.basename(os.path.abspath(directorio))}-", dir=padre)
+    publicado = False
+    try:
+        for i, bloque in enumerate(bloques):
+            if i == 0:
+                categorias = {col: bloque[col].cat.categories.tolist()
+                              for col in bloque.columns if isinstance(bloque[col].dtype, pd.CategoricalDtype)}
+                with open(os.path.join(tmp, 'categorias.json'), 'w', encoding='utf-8') as f:
+                    json.dump(categorias, f, ensure_ascii=False)
+            desde = bloque['Date'].min()
+            _guardar_frame(bloque, os.path.join(tmp, f"part-{i:05d}-{desde:%Y%m%d}"), categorias_externas=True)
+            yield bloque
+        if not os.path.exists(os.path.join(tmp, 'categorias.json')):
+            # Sin bloques no hay metadatos: `leer_particiones` no podría leer el directorio
+            raise ValueError("No se generó ningún bloque; no se publican particiones.")
+        # Publicación: la corrida anterior se aparta y se borra después del rename
+        anterior = None
+        if os.path.isdir(directorio):
+            anterior = tempfile.mkdtemp(prefix=f".{os.path.basename(tmp)}-anterior-", dir=padre)
+            os.rename(directorio, os.path.join(anterior, 'particiones'))
+        os.rename(tmp, directorio)
+        publicado = True
+        if anterior is not None:
+            shutil.rmtree(anterior, ignore_errors=True)
+    finally:
+        if not publicado:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def leer_particiones(directorio, mmap=True):
+    """Generador de las particiones escritas por `escribir_particiones`, en orden de fechas."""
+    with open(os.path.join(directorio, 'categorias.json'), encoding='utf-8') as f:
+        categorias = json.load(f)
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.startswith('part-'):
+            yield _cargar_frame(os.path.join(directorio, nombre), mmap=mmap, categorias=categorias)
+
+def ejecutar_pipeline_streaming(directorio, seed=42, fecha_inicio=FECHA_INICIO, fecha_fin=FECHA_FIN,
+                                frecuencia='M', metodo='minibatch', modelo=None, n_clientes=300, n_tiendas=8,
+                                tasa_actividad=0.4, workers=1):
+    """
+    Genera la tabla de hechos por bloques, la escribe particionada en `directorio` y acumula
+    los parciales mensuales bloque a bloque. Devuelve df_mensual_segmentado. La memoria pico
+    queda acotada por un bloque diario más la tabla mensual; nunca se materializa df_diario.
+    `workers` > 1 genera en paralelo las particiones mensuales de cada bloque.
+    """
+    print("Generando datos simulados por bloques (ETL streaming)...")
+    dim_clientes = None
+    lista_parciales = []
+    for bloque in escribir_particiones(generar_bloques(seed, fecha_inicio, fecha_fin, frecuencia, n_clientes,
+                                                            n_tiendas, tasa_actividad, workers), directorio):
+        if dim_clientes is None:
+            dim_clientes, _ = construir_dimensiones(bloque)
+        lista_parciales.append(_parciales_mensuales(bloque, len(dim_clientes)))
+    df_mensual_segmentado = _segmentar_mensual(_combinar_parciales(lista_parciales), dim_clientes,
+                                               metodo=metodo, modelo=modelo)
+    print(f"Pipeline streaming completado: {len(lista_parciales)} particiones en {directorio}.")
+    return df_mensual_segmentado
 
 # Ejecución de prueba si se corre este archivo solo
 if __name__ == "__main__":
-    df = generar_base_datos()
-    df_seg = generar_datos_clustering(df)
-    print(df_seg.head())
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="ETL de datos simulados del dashboard.")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="Construye el snapshot en disco que cargan los workers al iniciar.")
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help="Directorio de snapshots.")
+    parser.add_argument('--seed', type=int, default=42, help="Semilla de generación.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Procesos para generar las particiones mensuales en paralelo.")
+    parser.add_argument('--particiones', metavar='DIR',
+                        help="Modo streaming: escribe la tabla diaria particionada por mes en DIR.")
+    # Escala: por defecto la del entorno (GODATA_CLIENTES, ...), igual que el dashboard
+    escala = parametros_escala()
+    parser.add_argument('--clientes', type=int, dest='n_clientes', default=escala['n_clientes'])
+    parser.add_argument('--tiendas', type=int, dest='n_tiendas', default=escala['n_tiendas'])
+    parser.add_argument('--tasa-actividad', type=float, dest='tasa_actividad', default=escala['tasa_actividad'])
+    parser.add_argument('--desde', type=datetime.date.fromisoformat, dest='fecha_inicio',
+                        default=escala['fecha_inicio'], help="Fecha inicial (AAAA-MM-DD).")
+    parser.add_argument('--hasta', type=datetime.date.fromisoformat, dest='fecha_fin',
+                        default=escala['fecha_fin'], help="Fecha final (AAAA-MM-DD).")
+    args = parser.parse_args()
+    escala = {clave: getattr(args, clave) for clave in ESCALA_POR_DEFECTO}
+
+    if args.particiones:
+        df_seg = ejecutar_pipeline_streaming(args.particiones, seed=args.seed, workers=args.workers, **escala)
+        print(df_seg.head())
+    elif args.snapshot:
+        destino, publicado = construir_snapshot(seed=args.seed, directorio=args.dir, workers=args.workers, **escala)
+        print(f"Snapshot publicado en {destino}" if publicado else f"El snapshot {destino} ya existía; no se modificó")
+    else:
+        df = generar_base_datos(seed=args.seed, workers=args.workers, **escala)
+        df_seg = generar_datos_clustering(df)
+        print(df_seg.head())
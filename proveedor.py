@@ -0,0 +1,111 @@
+"""
+Proveedor perezoso de los datos del dashboard.
+
+Los datos (snapshot o ETL + clustering) se cargan en un hilo en segundo plano, así el
+servidor puede responder /healthz y servir el layout mientras tanto. Los callbacks
+esperan a que el proveedor esté listo antes de leer sus atributos.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+
+from dash.exceptions import PreventUpdate
+
+logger = logging.getLogger('godata.datos')
+
+
+class ProveedorDatos:
+    def __init__(self, cargar, espera_maxima=60):
+        # `cargar()` devuelve un dict {atributo: valor} que se publica en el proveedor
+        self._cargar = cargar
+        self.espera_maxima = espera_maxima
+        self.error = None
+        self.version = 0
+        self.segundos_carga = None
+        self._listo = threading.Event()
+        self._hilo = None
+        self._creado = time.perf_counter()
+        # Los hilos no sobreviven a un fork: si el worker nace antes de terminar la carga,
+        # la vuelve a lanzar en el hijo
+        os.register_at_fork(after_in_child=self._despues_de_fork)
+
+    def iniciar(self, en_segundo_plano=True):
+        """Lanza la carga (en un hilo daemon con `en_segundo_plano`, si no la ejecuta aquí mismo)."""
+        if en_segundo_plano:
+            self._hilo = threading.Thread(target=self._ejecutar_carga, name='carga-datos', daemon=True)
+            self._hilo.start()
+        else:
+            self._ejecutar_carga()
+            if self.error is not None:
+                raise self.error
+
+    def _ejecutar_carga(self):
+        inicio = time.perf_counter()
+        try:
+            valores = self._cargar()
+        except Exception as e:
+            logger.exception("Falló la carga de datos")
+            self.error = e
+            self._listo.set()
+            return
+        self.segundos_carga = time.perf_counter() - inicio
+        self.publicar(**valores)
+        logger.info("Datos listos en %.1f s", self.segundos_carga)
+
+    def _despues_de_fork(self):
+        if self._hilo is not None and not self._listo.is_set():
+            self._listo = threading.Event()
+            self.iniciar()
+
+    def publicar(self, **valores):
+        """Reemplaza los datos publicados (también para benchmarks que cambian de escala)."""
+        for nombre, valor in valores.items():
+            setattr(self, nombre, valor)
+        self.error = None
+        self.version += 1
+        self._listo.set()
+
+    def esperar_hilo(self):
+        """
+        Espera a los datos y a que el hilo de carga termine. Antes de un fork: un hijo que
+        nace con el hilo vivo hereda sus locks (logging, imports) y puede quedar bloqueado.
+        """
+        self.esperar()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    @property
+    def listo(self):
+        return self._listo.is_set() and self.error is None
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que los datos estén publicados. Devuelve False si vence `timeout`."""
+        if not self._listo.wait(timeout):
+            return False
+        if self.error is not None:
+            raise RuntimeError("La carga de datos falló") from self.error
+        return True
+
+    def estado(self):
+        return {
+            'listo': self.listo,
+            'error': repr(self.error) if self.error is not None else None,
+            'version': self.version,
+            'segundos_carga': self.segundos_carga,
+            'segundos_desde_inicio': time.perf_counter() - self._creado,
+        }
+
+    def requerido(self, func):
+        """
+        Decorador para callbacks: espera a los datos hasta `espera_maxima` segundos; si no
+        llegan a tiempo, no actualiza la salida (PreventUpdate) en lugar de fallar.
+        """
+        @functools.wraps(func)
+        def wrapper(*args):
+            if not self.esperar(self.espera_maxima):
+                logger.warning("%s sin datos tras %s s de espera", func.__name__, self.espera_maxima)
+                raise PreventUpdate
+            return func(*args)
+        return wrapper